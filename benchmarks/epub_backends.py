@@ -0,0 +1,45 @@
+"""Compare the html2text and lxml EPUB text backends for speed and output parity.
+
+Usage: python -m benchmarks.epub_backends book1.epub [book2.epub ...] [--repeat 3]
+"""
+import argparse
+import difflib
+import logging
+import re
+import time
+from bot.services.epub_processor import HTML2TEXT_BACKEND, LXML_BACKEND, extract_chapters, join_chapters
+
+WORD_RE = re.compile(r'\w+')
+
+def _time_backend(epub_path: str, backend: str, repeat: int, max_chars: int):
+    best = float("inf")
+    chapters = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chapters = extract_chapters(epub_path, max_chars, backend)
+        best = min(best, time.perf_counter() - started)
+    return best, chapters
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("epubs", nargs="+", help="EPUB files to extract")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per backend; the best time is reported")
+    parser.add_argument("--max-chars", type=int, default=10_000_000, help="character budget per book")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    print(f"{'book':40} {'html2text s':>12} {'lxml s':>8} {'speedup':>8} {'chapters':>9} {'words':>14} {'parity':>7}")
+    for epub_path in args.epubs:
+        slow_time, slow_chapters = _time_backend(epub_path, HTML2TEXT_BACKEND, args.repeat, args.max_chars)
+        fast_time, fast_chapters = _time_backend(epub_path, LXML_BACKEND, args.repeat, args.max_chars)
+        slow_words = WORD_RE.findall(join_chapters(slow_chapters))
+        fast_words = WORD_RE.findall(join_chapters(fast_chapters))
+        # Word-level similarity ignores markup differences such as html2text's **bold** markers
+        parity = difflib.SequenceMatcher(None, slow_words, fast_words).ratio()
+        chapters = f"{len(slow_chapters)}/{len(fast_chapters)}"
+        words = f"{len(slow_words)}/{len(fast_words)}"
+        print(f"{epub_path[-40:]:40} {slow_time:12.3f} {fast_time:8.3f} {slow_time / fast_time:7.1f}x "
+              f"{chapters:>9} {words:>14} {parity:7.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Compare the markdown -> HTML -> BeautifulSoup PDF converter with the direct element-tree one.
+
+Usage: python -m benchmarks.pdf_converters summary1.md [summary2.md ...] [--repeat 5]
+
+Without files, a generated workbook of about 7000 words (module sections, nested lists
+and tables, as the summary prompt produces) and a table-heavy worksheet are used.
+"""
+import argparse
+import logging
+import re
+import time
+from io import BytesIO
+import markdown
+from bs4 import BeautifulSoup
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, Spacer, Table, TableStyle, KeepTogether
+from reportlab.lib import colors
+from bot.services.pdf_generator import bold_font_name, build_pdf, font_name, markdown_to_flowables, styles
+
+WORD_RE = re.compile(r'\w+')
+
+# The converter used before bot.services.pdf_generator.markdown_to_flowables, kept for comparison
+def legacy_markdown_to_html(text):
+    """Convert markdown text to HTML."""
+    html = markdown.markdown(text, extensions=['tables', 'fenced_code'])
+    return html.replace('\n', '<br/>')  # Ensure line breaks are preserved
+
+def legacy_html_to_flowables(html_content):
+    """Convert HTML to ReportLab flowables."""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    flowables = []
+
+    for element in soup:
+        if element.name == 'h1':
+            flowables.append(KeepTogether(Paragraph(element.text.strip(), styles['Title'])))
+            flowables.append(Spacer(1, 0.3 * inch))
+        elif element.name == 'h2':
+            flowables.append(KeepTogether(Paragraph(element.text.strip(), styles['Heading1'])))
+            flowables.append(Spacer(1, 0.2 * inch))
+        elif element.name == 'h3':
+            flowables.append(Paragraph(element.text.strip(), styles['Heading2']))
+            flowables.append(Spacer(1, 0.15 * inch))
+        elif element.name == 'p':
+            text = element.decode_contents().strip()  # Preserve <br/> for line breaks
+            if text:
+                flowables.append(Paragraph(text, styles['BodyText']))
+                flowables.append(Spacer(1, 0.1 * inch))
+        elif element.name == 'ul':
+            for li in element.find_all('li'):
+                text = li.decode_contents().strip()
+                if text:
+                    flowables.append(Paragraph(f"• {text}", styles['Bullet']))
+                    flowables.append(Spacer(1, 0.05 * inch))
+        elif element.name == 'ol':
+            for i, li in enumerate(element.find_all('li'), 1):
+                text = li.decode_contents().strip()
+                if text:
+                    flowables.append(Paragraph(f"{i}. {text}", styles['Bullet']))
+                    flowables.append(Spacer(1, 0.05 * inch))
+        elif element.name == 'table':
+            data = []
+            for tr in element.find_all('tr'):
+                row = [Paragraph(td.decode_contents().strip(), styles['TableText']) for td in tr.find_all(['td', 'th'])]
+                data.append(row)
+            if data:
+                total_width = 7 * inch  # Adjusted for letter page with margins
+                col_count = len(data[0])
+                col_width = total_width / max(col_count, 1)
+                table = Table(data, colWidths=[col_width] * col_count)
+                table.setStyle(TableStyle([
+                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#E6F0FA')),
+                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+                    ('FONTNAME', (0, 0), (-1, 0), bold_font_name),
+                    ('FONTSIZE', (0, 0), (-1, 0), 10),
+                    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+                    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+                    ('FONTNAME', (0, 1), (-1, -1), font_name),
+                    ('FONTSIZE', (0, 1), (-1, -1), 10),
+                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+                    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+                    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+                    ('BOX', (0, 0), (-1, -1), 0.5, colors.grey),
+                    ('LEFTPADDING', (0, 0), (-1, -1), 6),
+                    ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+                    ('TOPPADDING', (0, 0), (-1, -1), 6),
+                    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F8F8F8')]),
+                ]))
+                flowables.append(KeepTogether(table))
+                flowables.append(Spacer(1, 0.2 * inch))
+        elif element.name == 'hr':
+            flowables.append(Spacer(1, 0.3 * inch))
+
+    return flowables
+
+def legacy_markdown_to_flowables(text):
+    return legacy_html_to_flowables(legacy_markdown_to_html(text))
+
+def sample_summary(modules: int = 13) -> str:
+    """A workbook-shaped markdown document of roughly 7000 words."""
+    sentence = "The author argues that deliberate practice compounds when feedback arrives quickly. "
+    sections = ["# Workbook: Sample Book\n\n" + sentence * 8]
+    for i in range(1, modules + 1):
+        sections.append(
+            f"## Module {i}: Key Idea {i}\n\n" + (sentence * 12 + "\n\n") * 3 +
+            f"### Exercises\n\n1. Reflect on **idea {i}**:\n    - write down *one* example\n"
+            f"    - compare it with a colleague's\n2. Apply it for a week\n\nTakeaways:\n\n"
+            "- Key takeaway\n- Another takeaway\n    - with a detail\n\n"
+            "| Concept | Example | Action |\n|---|---|---|\n" +
+            "\n".join(f"| Concept {j} | {sentence.strip()} | Try it on day {j} |" for j in range(1, 7)) +
+            "\n\n---\n"
+        )
+    return "\n".join(sections)
+
+def sample_worksheet(tables: int = 25, rows: int = 12) -> str:
+    """A worksheet-shaped markdown document made mostly of tables, some longer than a page."""
+    sections = ["# Worksheet: Sample Book\n"]
+    for i in range(1, tables + 1):
+        table_rows = rows * 6 if i % 5 == 0 else rows
+        sections.append(
+            f"## Exercise {i}\n\nFill in the table for chapter {i}.\n\n"
+            "| # | Question | Your answer | Notes |\n|---|---|---|---|\n" +
+            "\n".join(f"| {j} | How does the idea of chapter {i} apply to situation {j} at work and at home? "
+                      f"| ________ | **Tip:** compare with exercise {j} |" for j in range(1, table_rows + 1)) + "\n"
+        )
+    return "\n".join(sections)
+
+def _plain_words(flowables) -> list:
+    text = " ".join(f.getPlainText() for f in flowables if isinstance(f, Paragraph))
+    return WORD_RE.findall(text)
+
+def _time_converter(convert, text: str, repeat: int):
+    best_convert = best_total = float("inf")
+    flowables = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        flowables = convert(text)
+        converted = time.perf_counter()
+        build_pdf(flowables, BytesIO())
+        best_convert = min(best_convert, converted - started)
+        best_total = min(best_total, time.perf_counter() - started)
+    return best_convert, best_total, convert(text)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", help="markdown files, e.g. saved summaries")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per converter; the best time is reported")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    documents = [(path, open(path, encoding="utf-8").read()) for path in args.files] or [
+        ("generated summary", sample_summary()), ("generated worksheet", sample_worksheet())]
+    print(f"{'document':30} {'words':>6} {'html conv s':>12} {'tree conv s':>12} {'speedup':>8} "
+          f"{'html pdf s':>11} {'tree pdf s':>11} {'paragraph words':>16}")
+    for name, text in documents:
+        slow_convert, slow_total, slow_flowables = _time_converter(legacy_markdown_to_flowables, text, args.repeat)
+        fast_convert, fast_total, fast_flowables = _time_converter(markdown_to_flowables, text, args.repeat)
+        # The HTML path repeats nested list items inside their parent item, so it counts more words
+        words = f"{len(_plain_words(slow_flowables))}/{len(_plain_words(fast_flowables))}"
+        print(f"{name[-30:]:30} {len(WORD_RE.findall(text)):6} {slow_convert:12.3f} {fast_convert:12.3f} "
+              f"{slow_convert / fast_convert:7.1f}x {slow_total:11.3f} {fast_total:11.3f} {words:>16}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Precompute summaries, worksheets, quizzes and analyses for a directory of EPUBs.
+
+Every book is run through the same extraction and DeepSeekService calls as the bot, so
+the responses land in the response cache the bot reads and those books are then served
+without waiting for the model. Finished jobs are recorded in a checkpoint file, and an
+interrupted run resumes where it stopped.
+
+Usage: python -m bot.batch books/ [--concurrency 2] [--checkpoint cache/batch_checkpoint.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Optional
+from bot.config.settings import settings
+from bot.services.deepseek_service import DeepSeekService
+from bot.services.epub_processor import file_sha256, process_epub_async
+from bot.services.executor import shutdown_executor
+from bot.services.http_client import close_http_client
+from bot.services.llm_usage import usage_stats
+from bot.utils.prompts import ACTION_PROMPTS, LANGUAGES, get_prompt
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class Checkpoint:
+    """JSON record of finished jobs, keyed by book hash, action and language.
+
+    Keys use the file hash rather than its name, so renamed or duplicated books are
+    not generated twice. Failed jobs are recorded with their error and retried on the
+    next run.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = asyncio.Lock()
+        self.jobs: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.jobs = json.load(f)
+            logger.info(f"Loaded checkpoint {path}: {sum(job.get('done', False) for job in self.jobs.values())} jobs done")
+
+    @staticmethod
+    def key(digest: str, action: str, language: str) -> str:
+        return f"{digest}:{action}:{language}"
+
+    def is_done(self, key: str) -> bool:
+        return self.jobs.get(key, {}).get("done", False)
+
+    async def mark(self, key: str, book: str, done: bool, seconds: float, error: Optional[str] = None):
+        async with self._lock:
+            self.jobs[key] = {"book": book, "done": done, "seconds": round(seconds, 1), "error": error,
+                              "finished_at": time.time()}
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.jobs, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+
+async def run_job(service: DeepSeekService, checkpoint: Checkpoint, semaphore: asyncio.Semaphore,
+                  epub_path: Path, digest: str, action: str, language: str, output_dir: Optional[str]) -> bool:
+    key = Checkpoint.key(digest, action, language)
+    if checkpoint.is_done(key):
+        logger.info(f"Skipping {epub_path.name} {action} ({language}): already done")
+        return True
+    async with semaphore:
+        started = time.monotonic()
+        # Without an output directory the PDF is rendered in memory and dropped
+        output = os.path.join(output_dir, f"{epub_path.stem}_{action}_{language}.pdf") if output_dir else BytesIO()
+        prompt = get_prompt(action, language)
+        try:
+            content = await process_epub_async(str(epub_path))
+            if action == "summary":
+                await service.generate_pdf_parts(content, prompt, output)
+            else:
+                await service.generate_pdf(content, prompt, output)
+        except Exception as e:
+            logger.error(f"Failed {epub_path.name} {action} ({language}): {str(e)}")
+            await checkpoint.mark(key, epub_path.name, False, time.monotonic() - started, str(e))
+            return False
+        seconds = time.monotonic() - started
+        logger.info(f"Finished {epub_path.name} {action} ({language}) in {seconds:.0f}s")
+        await checkpoint.mark(key, epub_path.name, True, seconds)
+        return True
+
+async def run_batch(epub_dir: str, checkpoint_path: str, concurrency: int, actions, languages,
+                    output_dir: Optional[str] = None) -> int:
+    """Run every action in every language for each EPUB in ``epub_dir``; returns the number of failed jobs."""
+    epub_paths = sorted(Path(epub_dir).glob("*.epub"))
+    logger.info(f"Found {len(epub_paths)} EPUB files in {epub_dir}")
+    checkpoint = Checkpoint(checkpoint_path)
+    semaphore = asyncio.Semaphore(concurrency)
+    service = DeepSeekService()
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    tasks = []
+    for epub_path in epub_paths:
+        digest = await asyncio.to_thread(file_sha256, str(epub_path))
+        for action in actions:
+            for language in languages:
+                tasks.append(run_job(service, checkpoint, semaphore, epub_path, digest, action, language,
+                                     output_dir))
+    results = await asyncio.gather(*tasks)
+    failed = results.count(False)
+    logger.info(f"Batch finished: {len(results) - failed} of {len(results)} jobs done, {failed} failed; "
+                f"{usage_stats.requests} model requests, "
+                f"prompt cache hit ratio {usage_stats.totals.cache_hit_ratio:.0%}")
+    return failed
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("epub_dir", help="directory of EPUB files")
+    parser.add_argument("--checkpoint", default="cache/batch_checkpoint.json", help="file recording finished jobs")
+    parser.add_argument("--concurrency", type=int, default=2, help="jobs (book, action, language) run at once")
+    parser.add_argument("--actions", nargs="+", choices=list(ACTION_PROMPTS), default=list(ACTION_PROMPTS))
+    parser.add_argument("--languages", nargs="+", choices=LANGUAGES, default=list(LANGUAGES))
+    parser.add_argument("--output-dir", help="keep the generated PDFs here instead of discarding them")
+    args = parser.parse_args()
+    if not settings.LLM_CACHE_ENABLED:
+        parser.error("LLM_CACHE_ENABLED is off, so the bot would not see any batch results")
+    try:
+        return await run_batch(args.epub_dir, args.checkpoint, args.concurrency, args.actions,
+                               args.languages, args.output_dir)
+    finally:
+        await close_http_client()
+        shutdown_executor()
+
+if __name__ == "__main__":
+    raise SystemExit(1 if asyncio.run(main()) else 0)
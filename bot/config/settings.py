@@ -1,11 +1,73 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     BOT_TOKEN: str
     DEEPSEEK_API_KEY: str
+
+    # Process pool for EPUB parsing and PDF rendering (defaults to the CPU count)
+    CPU_WORKERS: Optional[int] = None
+
+    # EPUB extraction
+    EPUB_MAX_CHARS: int = 600_000
+    # HTML-to-text converter for chapters: "html2text" or "lxml" (faster)
+    EPUB_TEXT_BACKEND: str = "html2text"
+
+    # EPUB extraction cache
+    EPUB_CACHE_MAX_ENTRIES: int = 64
+    EPUB_CACHE_MAX_CHARS: int = 20_000_000
+    EPUB_CACHE_DIR: Optional[str] = None
+
+    # tiktoken encoding used for prompt budgeting
+    TOKENIZER_ENCODING: str = "cl100k_base"
+
+    # Chunking of book text that does not fit in a single request
+    CHUNK_MAX_TOKENS: int = 24000
+    CHUNK_OVERLAP_TOKENS: int = 400
+
+    # Map-reduce condensing of books larger than the context window
+    MAP_REDUCE_CONCURRENCY: int = 8
+    MAP_REDUCE_MAX_LEVELS: int = 2
+
+    # Global limits on DeepSeek traffic shared by all users
+    LLM_MAX_IN_FLIGHT: int = 30
+    LLM_TOKENS_PER_MINUTE: int = 2_000_000
+    HTTP_MAX_CONNECTIONS: int = 50
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    CHECKLIST_TIMEOUT_SECONDS: float = 300
+    # Stream model output to report progress while it is generated
+    LLM_STREAMING: bool = True
+    # How long later module parts wait for the first part to warm DeepSeek's context cache
+    PREFIX_WARMUP_SECONDS: float = 30
+    # Module planner: the summary's modules are split into parallel jobs of at most
+    # MODULE_JOB_MAX_WORDS words each
+    MODULE_JOB_MAX_WORDS: int = 1800
+    MODULE_JOBS_MAX_PARALLEL: int = 4
+    # Deadline for each generation job, including retries and hedged requests
+    LLM_JOB_DEADLINE_SECONDS: float = 900
+    # A duplicate request is sent when a call runs past this latency percentile of similar
+    # calls (or the default delay until enough calls have been timed); the loser is cancelled
+    LLM_HEDGING_ENABLED: bool = True
+    HEDGE_PERCENTILE: float = 0.95
+    HEDGE_DEFAULT_DELAY_SECONDS: float = 300
+    # Hedge with deepseek-chat when a reasoner call could not finish before the deadline
+    LLM_FALLBACK_TO_CHAT: bool = True
+    # A part that comes back short is extended with up to this many continuation requests,
+    # each given only the last CONTINUATION_TAIL_CHARS characters of the answer so far
+    CONTINUATION_MAX_ROUNDS: int = 2
+    CONTINUATION_TAIL_CHARS: int = 3000
+
+    # PDFs are rendered and uploaded from memory; larger ones are spooled to a unique file first
+    PDF_SPOOL_THRESHOLD_BYTES: int = 20 * 1024 * 1024
+
+    # Persistent cache of model responses
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_URL: str = "sqlite:///cache/llm_responses.sqlite3"
+    LLM_CACHE_TTL_SECONDS: int = 30 * 24 * 3600
+    LLM_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
     
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -1,19 +1,21 @@
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
-from bot.services.epub_processor import process_epub
+from bot.services.epub_processor import process_epub_async
 from bot.services.deepseek_service import DeepSeekService
-from bot.utils.prompts import SUMMARY_PROMPT_EN, WORKSHEET_PROMPT_EN, QUIZ_PROMPT_EN, ANALYSIS_PROMPT_EN
-from bot.utils.prompts import SUMMARY_PROMPT_RU, WORKSHEET_PROMPT_RU, QUIZ_PROMPT_RU, ANALYSIS_PROMPT_RU
+from bot.utils.pdf_upload import send_pdf
+from bot.utils.progress import ProgressReporter
+from bot.utils.prompts import get_prompt
 import os
 import logging
 import asyncio
+from io import BytesIO
 
 router = Router()
 logger = logging.getLogger(__name__)
 
 @router.callback_query(F.data == "summary")
-async def process_summary(callback: CallbackQuery, state: FSMContext):
+async def process_summary(callback: CallbackQuery, state: FSMContext, deepseek: DeepSeekService):
     await callback.answer()
     data = await state.get_data()
     language = data.get("language", "en")
@@ -32,35 +34,30 @@ async def process_summary(callback: CallbackQuery, state: FSMContext):
         await status_msg.edit_text(
             "Извлекаю содержимое EPUB..." if language == "ru" else "Extracting EPUB content..."
         )
-        content = process_epub(epub_path)
+        content = await process_epub_async(epub_path)
         
         await status_msg.edit_text(
             "Генерирую конспект (Модули 1-8)..." if language == "ru" else 
             "Generating summary (Modules 1-8)..."
         )
-        deepseek = DeepSeekService()
-        prompt = SUMMARY_PROMPT_RU if language == "ru" else SUMMARY_PROMPT_EN
-        output_path = f"temp/summary_{callback.message.chat.id}.pdf"
+        prompt = get_prompt("summary", language)
         
         await status_msg.edit_text(
             "Генерирую PDF конспекта..." if language == "ru" else 
             "Generating summary PDF..."
         )
-        pdf_paths = await deepseek.generate_pdf_parts(content, prompt, output_path)
+        progress = ProgressReporter(
+            status_msg, "Генерирую конспект" if language == "ru" else "Generating summary",
+            target_words=deepseek.max_word_count_total, language=language
+        )
+        pdf = BytesIO()
+        await deepseek.generate_pdf_parts(content, prompt, pdf, on_progress=progress.update)
         
         await status_msg.edit_text(
             "Загружаю PDF конспекта..." if language == "ru" else 
             "Uploading summary PDF..."
         )
-        for pdf_path in pdf_paths:
-            if os.path.exists(pdf_path):
-                with open(pdf_path, 'rb') as pdf_file:
-                    await callback.message.answer_document(
-                        document=FSInputFile(pdf_path, filename="summary.pdf")
-                    )
-                os.remove(pdf_path)
-            else:
-                logger.warning(f"PDF not found at {pdf_path}")
+        await send_pdf(callback.message, pdf, "summary.pdf")
         
         await status_msg.edit_text(
             "Конспект готов! Отправьте новый EPUB или выберите другое действие." if language == "ru" else 
@@ -74,7 +71,7 @@ async def process_summary(callback: CallbackQuery, state: FSMContext):
         )
 
 @router.callback_query(F.data == "worksheet")
-async def process_worksheet(callback: CallbackQuery, state: FSMContext):
+async def process_worksheet(callback: CallbackQuery, state: FSMContext, deepseek: DeepSeekService):
     await callback.answer()
     data = await state.get_data()
     language = data.get("language", "en")
@@ -93,24 +90,23 @@ async def process_worksheet(callback: CallbackQuery, state: FSMContext):
         await status_msg.edit_text(
             "Извлекаю содержимое EPUB..." if language == "ru" else "Extracting EPUB content..."
         )
-        content = process_epub(epub_path)
+        content = await process_epub_async(epub_path)
         
         await status_msg.edit_text(
             "Генерирую тетрадь с заданиями..." if language == "ru" else "Generating worksheet..."
         )
-        deepseek = DeepSeekService()
-        prompt = WORKSHEET_PROMPT_RU if language == "ru" else WORKSHEET_PROMPT_EN
-        pdf_path = await deepseek.generate_pdf(content, prompt, f"temp/worksheet_{callback.message.chat.id}.pdf")
+        prompt = get_prompt("worksheet", language)
+        progress = ProgressReporter(
+            status_msg, "Генерирую тетрадь с заданиями" if language == "ru" else "Generating worksheet",
+            target_words=5000, language=language
+        )
+        pdf = BytesIO()
+        await deepseek.generate_pdf(content, prompt, pdf, on_progress=progress.update)
         
         await status_msg.edit_text(
             "Загружаю PDF тетради..." if language == "ru" else "Uploading worksheet PDF..."
         )
-        if os.path.exists(pdf_path):
-            with open(pdf_path, 'rb') as pdf_file:
-                await callback.message.answer_document(
-                    document=FSInputFile(pdf_path, filename="worksheet.pdf")
-                )
-            os.remove(pdf_path)
+        await send_pdf(callback.message, pdf, "worksheet.pdf")
         
         await status_msg.edit_text(
             "Тетрадь готова! Отправьте новый EPUB или выберите другое действие." if language == "ru" else 
@@ -124,7 +120,7 @@ async def process_worksheet(callback: CallbackQuery, state: FSMContext):
         )
 
 @router.callback_query(F.data == "quiz")
-async def process_quiz(callback: CallbackQuery, state: FSMContext):
+async def process_quiz(callback: CallbackQuery, state: FSMContext, deepseek: DeepSeekService):
     await callback.answer()
     data = await state.get_data()
     language = data.get("language", "en")
@@ -143,24 +139,23 @@ async def process_quiz(callback: CallbackQuery, state: FSMContext):
         await status_msg.edit_text(
             "Извлекаю содержимое EPUB..." if language == "ru" else "Extracting EPUB content..."
         )
-        content = process_epub(epub_path)
+        content = await process_epub_async(epub_path)
         
         await status_msg.edit_text(
             "Генерирую тест..." if language == "ru" else "Generating quiz..."
         )
-        deepseek = DeepSeekService()
-        prompt = QUIZ_PROMPT_RU if language == "ru" else QUIZ_PROMPT_EN
-        pdf_path = await deepseek.generate_pdf(content, prompt, f"temp/quiz_{callback.message.chat.id}.pdf")
+        prompt = get_prompt("quiz", language)
+        progress = ProgressReporter(
+            status_msg, "Генерирую тест" if language == "ru" else "Generating quiz",
+            target_words=3000, language=language
+        )
+        pdf = BytesIO()
+        await deepseek.generate_pdf(content, prompt, pdf, on_progress=progress.update)
         
         await status_msg.edit_text(
             "Загружаю PDF теста..." if language == "ru" else "Uploading quiz PDF..."
         )
-        if os.path.exists(pdf_path):
-            with open(pdf_path, 'rb') as pdf_file:
-                await callback.message.answer_document(
-                    document=FSInputFile(pdf_path, filename="quiz.pdf")
-                )
-            os.remove(pdf_path)
+        await send_pdf(callback.message, pdf, "quiz.pdf")
         
         await status_msg.edit_text(
             "Тест готов! Отправьте новый EPUB или выберите другое действие." if language == "ru" else 
@@ -174,7 +169,7 @@ async def process_quiz(callback: CallbackQuery, state: FSMContext):
         )
 
 @router.callback_query(F.data == "analysis")
-async def process_analysis(callback: CallbackQuery, state: FSMContext):
+async def process_analysis(callback: CallbackQuery, state: FSMContext, deepseek: DeepSeekService):
     await callback.answer()
     data = await state.get_data()
     language = data.get("language", "en")
@@ -193,24 +188,23 @@ async def process_analysis(callback: CallbackQuery, state: FSMContext):
         await status_msg.edit_text(
             "Извлекаю содержимое EPUB..." if language == "ru" else "Extracting EPUB content..."
         )
-        content = process_epub(epub_path)
+        content = await process_epub_async(epub_path)
         
         await status_msg.edit_text(
             "Генерирую анализ..." if language == "ru" else "Generating analysis..."
         )
-        deepseek = DeepSeekService()
-        prompt = ANALYSIS_PROMPT_RU if language == "ru" else ANALYSIS_PROMPT_EN
-        pdf_path = await deepseek.generate_pdf(content, prompt, f"temp/analysis_{callback.message.chat.id}.pdf")
+        prompt = get_prompt("analysis", language)
+        progress = ProgressReporter(
+            status_msg, "Генерирую анализ" if language == "ru" else "Generating analysis",
+            target_words=5000, language=language
+        )
+        pdf = BytesIO()
+        await deepseek.generate_pdf(content, prompt, pdf, on_progress=progress.update)
         
         await status_msg.edit_text(
             "Загружаю PDF анализа..." if language == "ru" else "Uploading analysis PDF..."
         )
-        if os.path.exists(pdf_path):
-            with open(pdf_path, 'rb') as pdf_file:
-                await callback.message.answer_document(
-                    document=FSInputFile(pdf_path, filename="analysis.pdf")
-                )
-            os.remove(pdf_path)
+        await send_pdf(callback.message, pdf, "analysis.pdf")
         
         await status_msg.edit_text(
             "Анализ готов! Отправьте новый EPUB или выберите другое действие." if language == "ru" else 
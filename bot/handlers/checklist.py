@@ -1,19 +1,23 @@
-import os
 import asyncio
+from typing import Dict
 from aiogram import Router, F
-from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, FSInputFile
+from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.filters import Command
 from bot.services.deepseek_checklist_service import ChecklistService
-from bot.services.pdf_generator import generate_pdf
+from bot.services.pdf_generator import render_pdf_bytes
+from bot.services.executor import run_cpu_bound
+from bot.utils.pdf_upload import send_pdf
+from bot.utils.progress import ProgressReporter
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 router = Router()
-checklist_service = ChecklistService()  # Initialize the service
+# In-flight checklist generations by user id, so an abandoned request can be cancelled
+active_jobs: Dict[int, asyncio.Task] = {}
 
 # Define states
 class ChecklistStates(StatesGroup):
@@ -21,41 +25,62 @@ class ChecklistStates(StatesGroup):
     processing = State()
 
 
+def cancel_active_job(user_id: int) -> bool:
+    """Cancel the user's in-flight checklist generation, if any."""
+    task = active_jobs.pop(user_id, None)
+    if task is None or task.done():
+        return False
+    task.cancel()
+    return True
+
 @router.message(F.text == "Чеклист")
 async def checklist_start(message: Message, state: FSMContext):
     """Handle 'Checklist' button press."""
+    if cancel_active_job(message.from_user.id):
+        logger.info(f"Cancelled previous checklist for user {message.from_user.id}")
     await state.set_state(ChecklistStates.awaiting_request)
     await message.answer("Пожалуйста, уточните, для какой задачи нужен чек-лист? Укажите детали задачи.")
 
+@router.message(Command("cancel"))
+async def cancel_command(message: Message, state: FSMContext):
+    """Handle /cancel: abort an in-flight checklist generation."""
+    cancelled = cancel_active_job(message.from_user.id)
+    if await state.get_state() in (ChecklistStates.awaiting_request.state, ChecklistStates.processing.state):
+        await state.set_state(None)
+    await message.answer("Создание чек-листа отменено." if cancelled else "Нет активного запроса.")
+
 @router.message(ChecklistStates.awaiting_request)
-async def process_request(message: Message, state: FSMContext):
+async def process_request(message: Message, state: FSMContext, checklist_service: ChecklistService):
     """Process the user's checklist request and send a PDF."""
     await state.set_state(ChecklistStates.processing)
     user_request = message.text
-    temp_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'temp')
-    os.makedirs(temp_dir, exist_ok=True)
-    pdf_path = os.path.join(temp_dir, f"checklist_{message.from_user.id}_{message.message_id}.pdf")
+    task = None
 
     try:
         # Generate checklist text and PDF
-        checklist_content = await checklist_service.generate_checklist_text(user_request)
-        pdf_path = generate_pdf(checklist_content, pdf_path)
+        status_msg = await message.answer("Создаю чек-лист...")
+        progress = ProgressReporter(status_msg, "Создаю чек-лист", target_words=2000, language="ru")
+        task = asyncio.create_task(checklist_service.generate_checklist_text(user_request, on_progress=progress.update))
+        active_jobs[message.from_user.id] = task
+        checklist_content = await task
+        pdf_bytes = await run_cpu_bound(render_pdf_bytes, checklist_content)
         
         # Send the PDF to the user
-        await message.answer_document(FSInputFile(pdf_path, filename="checklist.pdf"))
-        logger.info(f"Sent PDF to user {message.from_user.id} at {pdf_path}")
+        await send_pdf(message, pdf_bytes, "checklist.pdf")
+        logger.info(f"Sent PDF to user {message.from_user.id} ({len(pdf_bytes)} bytes)")
+    except asyncio.CancelledError:
+        # Only swallow cancellation requested by the user, not shutdown of this handler
+        if asyncio.current_task().cancelling():
+            raise
+        logger.info(f"Checklist request cancelled for user {message.from_user.id}")
     except Exception as e:
         logger.error(f"Error processing request for user {message.from_user.id}: {str(e)}")
         await message.answer("Произошла ошибка при создании чек-листа. Пожалуйста, попробуйте еще раз.")
     finally:
-        # Clean up the temporary PDF file
-        try:
-            if os.path.exists(pdf_path):
-                os.remove(pdf_path)
-                logger.info(f"Deleted temporary PDF: {pdf_path}")
-        except Exception as e:
-            logger.warning(f"Failed to delete temporary PDF {pdf_path}: {str(e)}")
-        await state.clear()
+        if active_jobs.get(message.from_user.id) is task:
+            del active_jobs[message.from_user.id]
+        if await state.get_state() == ChecklistStates.processing.state:
+            await state.clear()
 
 @router.message(Command("checklist"))
 async def checklist_command(message: Message, state: FSMContext):
@@ -3,6 +3,10 @@ import logging
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 from bot.config.settings import settings
+from bot.services.executor import shutdown_executor
+from bot.services.deepseek_service import DeepSeekService
+from bot.services.deepseek_checklist_service import ChecklistService
+from bot.services.http_client import close_http_client
 from bot.handlers import start, epub, buttons, language, checklist
 
 logging.basicConfig(level=logging.INFO)
@@ -11,6 +15,9 @@ logger = logging.getLogger(__name__)
 async def main():
     bot = Bot(token=settings.BOT_TOKEN)
     dp = Dispatcher(storage=MemoryStorage())
+    # Shared by every handler through aiogram's dependency injection
+    dp["deepseek"] = DeepSeekService()
+    dp["checklist_service"] = ChecklistService()
     
 
     dp.include_routers(start.router, epub.router, buttons.router, language.router, checklist.router)
@@ -19,6 +26,8 @@ async def main():
         await dp.start_polling(bot)
     finally:
         await bot.session.close()
+        await close_http_client()
+        shutdown_executor()
 #sssss
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
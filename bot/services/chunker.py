@@ -0,0 +1,46 @@
+import logging
+from functools import lru_cache
+from typing import List
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from bot.config.settings import settings
+from bot.services.tokenizer import count_tokens
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Tried in order: chapter and section headings, paragraphs, lines, sentences, words
+SEPARATORS = [
+    r"\n(?=# )",
+    r"\n(?=## )",
+    r"\n\n+",
+    r"\n",
+    r"(?<=[.!?…])\s+",
+    r"\s+",
+    "",
+]
+
+@lru_cache(maxsize=16)
+def _get_splitter(max_tokens: int, overlap_tokens: int) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        separators=SEPARATORS,
+        is_separator_regex=True,
+        keep_separator="start",
+        chunk_size=max_tokens,
+        chunk_overlap=overlap_tokens,
+        length_function=count_tokens
+    )
+
+def split_content(content: str, max_tokens: int = None, overlap_tokens: int = None) -> List[str]:
+    """Split book text into chunks of at most ``max_tokens`` tokens on natural boundaries.
+
+    Chapters are kept whole when they fit; otherwise the text is cut at the largest
+    boundary that does (section, paragraph, line, sentence, then word). Consecutive
+    chunks share up to ``overlap_tokens`` tokens of context.
+    """
+    max_tokens = max_tokens or settings.CHUNK_MAX_TOKENS
+    overlap_tokens = settings.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    if count_tokens(content) <= max_tokens:
+        return [content]
+    chunks = _get_splitter(max_tokens, min(overlap_tokens, max_tokens // 2)).split_text(content)
+    logger.info(f"Split {len(content)} chars into {len(chunks)} chunks of at most {max_tokens} tokens")
+    return chunks
@@ -1,7 +1,13 @@
 import os
-from openai import OpenAI
+from typing import Awaitable, Callable, Optional
+from openai import NOT_GIVEN, AsyncOpenAI
 from bot.config.settings import settings
 from bot.services.pdf_generator import generate_pdf
+from bot.services.executor import run_cpu_bound
+from bot.services.llm_cache import response_cache
+from bot.services.rate_limiter import llm_limiter
+from bot.services.http_client import close_http_client, get_http_client
+from bot.services.llm_usage import usage_from_dict, usage_stats
 import logging
 import asyncio
 
@@ -10,10 +16,12 @@ logger = logging.getLogger(__name__)
 
 class ChecklistService:
     def __init__(self):
-        """Initialize the OpenAI client for DeepSeek API and system prompt."""
-        self.client = OpenAI(
+        """Initialize the async OpenAI client for DeepSeek API and system prompt."""
+        self.client = AsyncOpenAI(
             api_key=settings.DEEPSEEK_API_KEY,
-            base_url="https://api.deepseek.com"
+            base_url="https://api.deepseek.com",
+            http_client=get_http_client(),
+            timeout=settings.CHECKLIST_TIMEOUT_SECONDS
         )
         self.system_prompt = """
 Ты специалист по созданию проверочных списков и чек-листов для любой задачи.
@@ -25,32 +33,76 @@ class ChecklistService:
 4. Придерживайся текстов без излишней эмоциональной или художественной окраски.
 """
 
-    async def generate_checklist_text(self, user_prompt: str) -> str:
-        """Generate checklist text based on the user prompt."""
+    async def generate_checklist_text(self, user_prompt: str, timeout: Optional[float] = None,
+                                      on_progress: Optional[Callable[[str, int], Awaitable[None]]] = None) -> str:
+        """Generate checklist text based on the user prompt.
+
+        Cancelling the awaiting task aborts the HTTP request. With streaming enabled,
+        ``on_progress`` is called with ``("all", words_so_far)`` as text arrives.
+        """
         logger.info(f"Generating checklist text for prompt: {user_prompt}")
+        cache_key = response_cache.make_key("deepseek-chat", self.system_prompt, user_prompt)
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            return cached
         try:
-            response = await asyncio.to_thread(self.client.chat.completions.create,
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=8000,
-                stream=False
-            )
-            generated_text = response.choices[0].message.content
+            async with llm_limiter.acquire(8000):
+                response = await self.client.chat.completions.create(
+                    model="deepseek-chat",
+                    messages=[
+                        {"role": "system", "content": self.system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    max_tokens=8000,
+                    stream=settings.LLM_STREAMING,
+                    stream_options={"include_usage": True} if settings.LLM_STREAMING else NOT_GIVEN,
+                    timeout=timeout or settings.CHECKLIST_TIMEOUT_SECONDS
+                )
+                if settings.LLM_STREAMING:
+                    generated_text, usage = await self._consume_stream(response, on_progress)
+                else:
+                    generated_text = response.choices[0].message.content
+                    usage = response.usage
+            usage_stats.record("checklist", "deepseek-chat", usage_from_dict(usage.model_dump() if usage else None))
             logger.info("Checklist text generated successfully")
+            await response_cache.set(cache_key, "deepseek-chat", generated_text)
             return generated_text
+        except asyncio.CancelledError:
+            logger.info("Checklist generation cancelled")
+            raise
         except Exception as e:
             logger.error(f"Error generating checklist text: {str(e)}")
             raise
 
+    @staticmethod
+    async def _consume_stream(stream, on_progress):
+        """Return the streamed text and the usage sent with the final chunk.
+
+        The stream is closed on exit, so cancellation releases the pooled connection
+        and stops the request instead of leaving it to garbage collection.
+        """
+        pieces = []
+        words = 0
+        usage = None
+        async with stream:
+            async for chunk in stream:
+                usage = chunk.usage or usage
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                # A word split across two chunks is counted once
+                words += len(delta.split()) - (1 if pieces and not pieces[-1][-1].isspace() and not delta[0].isspace() else 0)
+                pieces.append(delta)
+                if on_progress is not None:
+                    await on_progress("all", words)
+        return "".join(pieces), usage
+
     async def generate_checklist_pdf(self, user_prompt: str, output_path: str) -> str:
         """Generate a PDF from the checklist text."""
         logger.info(f"Starting PDF generation for: {output_path}")
         try:
             checklist_text = await self.generate_checklist_text(user_prompt)
-            pdf_path = generate_pdf(checklist_text, output_path)
+            pdf_path = await run_cpu_bound(generate_pdf, checklist_text, output_path)
             logger.info(f"PDF generated at {pdf_path}")
             return pdf_path
         except Exception as e:
@@ -64,6 +116,7 @@ async def main():
     output_path = "checklist.pdf"
     pdf_path = await service.generate_checklist_pdf(user_prompt, output_path)
     print(f"PDF generated at: {pdf_path}")
+    await close_http_client()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
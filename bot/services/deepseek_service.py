@@ -1,129 +1,528 @@
-from langchain.prompts import PromptTemplate
+from langchain_core.messages import AIMessageChunk, BaseMessage, HumanMessage, SystemMessage
 from langchain_core.runnables import RunnableSequence
 from langchain_deepseek.chat_models import ChatDeepSeek
-from bot.services.pdf_generator import generate_pdf
+from bot.services.pdf_generator import (IncrementalPdfBuilder, PdfOutput, layout_pdf_bytes, output_label,
+                                        section_break_flowables, write_pdf)
+from bot.services.tokenizer import estimate_tokens, truncate_to_tokens
+from bot.services.chunker import split_content
+from bot.services.llm_cache import response_cache
+from bot.services.executor import run_cpu_bound
+from bot.services.rate_limiter import llm_limiter
+from bot.services.http_client import get_http_client
+from bot.services.llm_errors import TOO_LONG, classify_error, context_overflow_ratio, llm_retry
+from bot.services.latency import latency_tracker, run_with_deadline, time_remaining
+from bot.services.module_planner import ModuleJob, count_modules, plan_module_jobs
+from bot.services.llm_usage import RequestUsage, usage_from_message, usage_stats
 from bot.config.settings import settings
+from bot.utils.prompts import BOOK_SYSTEM_PROMPT, BOOK_USER_TEMPLATE, CHAPTER_DIGEST_PROMPT, CONTINUATION_PROMPT
 import logging
-from tenacity import retry, stop_after_attempt, wait_exponential
 import asyncio
 import re
+import time
+from functools import lru_cache
+from typing import Awaitable, Callable, List, Optional, Tuple
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+WORD_RE = re.compile(r'\w+')
+
+@lru_cache(maxsize=64)
+def count_words(text: str) -> int:
+    """Number of words in ``text``.
+
+    Memoized because the same generated text is counted for logging, for the part's
+    word target and for the total; strings cache their hash, so a repeat lookup does
+    not rescan the text.
+    """
+    return len(WORD_RE.findall(text))
+
+# Continuations that open a markdown block: heading, table row, list item, rule or code fence
+BLOCK_START_RE = re.compile(r'(?:#{1,6} |\||[-*+] |\d+\. |---|```)')
+SENTENCE_END_CHARS = '.!?:;…"»)'
+
+def continuation_suffix(text: str, continuation: str) -> str:
+    """What to append to ``text`` for ``continuation``, with a separator that keeps markdown blocks apart.
+
+    A continuation that opens a block, or follows a finished line or sentence, starts a
+    new paragraph; only a mid-sentence continuation is joined with a space.
+    """
+    if not text:
+        return continuation
+    stripped = continuation.lstrip()
+    if text.endswith('\n') or BLOCK_START_RE.match(stripped) or text.rstrip()[-1:] in SENTENCE_END_CHARS:
+        trailing_newlines = len(text) - len(text.rstrip('\n'))
+        return '\n' * max(0, 2 - trailing_newlines) + stripped
+    if text[-1:].isspace() or continuation[:1].isspace():
+        return continuation
+    return ' ' + continuation
+
+# Called with (module_range, words generated so far) while a response streams in
+ProgressCallback = Callable[[str, int], Awaitable[None]]
+
+# The system message is built once and shared by every request. The user message puts
+# the book before the instructions, so system prompt plus book form a prefix that
+# DeepSeek's context cache serves for other module parts and follow-up actions.
+BOOK_SYSTEM_MESSAGE = SystemMessage(content=BOOK_SYSTEM_PROMPT.strip())
+
+def build_book_messages(content: str, instructions: str) -> List[BaseMessage]:
+    """Messages for one request; built once and reused by its retries and hedged duplicates."""
+    return [BOOK_SYSTEM_MESSAGE, HumanMessage(content=BOOK_USER_TEMPLATE.format(content=content, instructions=instructions))]
+
+class UsageReportingChatDeepSeek(ChatDeepSeek):
+    """ChatDeepSeek that keeps the raw ``usage`` of streamed responses.
+
+    LangChain maps only the OpenAI-style usage fields into ``usage_metadata``, which
+    drops DeepSeek's ``prompt_cache_hit_tokens``/``prompt_cache_miss_tokens``.
+    """
+
+    def _convert_chunk_to_generation_chunk(self, chunk, default_chunk_class, base_generation_info):
+        generation_chunk = super()._convert_chunk_to_generation_chunk(chunk, default_chunk_class, base_generation_info)
+        if generation_chunk is not None and chunk.get("usage") and isinstance(generation_chunk.message, AIMessageChunk):
+            generation_chunk.message.response_metadata["token_usage"] = chunk["usage"]
+        return generation_chunk
+
+async def stream_text(model, messages: List[BaseMessage], module_range: str,
+                      on_progress: Optional[ProgressCallback] = None,
+                      on_text: Optional[Callable[[str], None]] = None,
+                      started: Optional[asyncio.Event] = None) -> Tuple[str, Optional[RequestUsage]]:
+    """Consume a model through ``astream``, reporting the running word count and each text delta.
+
+    ``started`` is set on the first chunk, i.e. once the provider has processed the prompt.
+    Returns the text and the usage reported with the last chunk.
+    """
+    pieces = []
+    words = 0
+    ended_in_word = False
+    usage = None
+    async for chunk in model.astream(messages):
+        if started is not None:
+            started.set()
+        usage = usage_from_message(chunk) or usage
+        delta = chunk.content if hasattr(chunk, 'content') else str(chunk)
+        if not delta:
+            continue
+        pieces.append(delta)
+        if on_text is not None:
+            on_text(delta)
+        # A word split across two chunks is counted once
+        words += len(WORD_RE.findall(delta)) - (1 if ended_in_word and WORD_RE.match(delta) else 0)
+        ended_in_word = WORD_RE.match(delta[-1]) is not None
+        if on_progress is not None:
+            await on_progress(module_range, words)
+    return "".join(pieces), usage
+
 class DeepSeekService:
+    """DeepSeek generation service, created once in ``bot.main`` and shared by all handlers."""
+
     def __init__(self):
-        self.llm = ChatDeepSeek(
+        self.http_client = get_http_client()
+        self.llm = UsageReportingChatDeepSeek(
             api_key=settings.DEEPSEEK_API_KEY,
             model="deepseek-reasoner",
             timeout=1200,
-            max_tokens=8000
+            max_tokens=8000,
+            stream_usage=True,
+            # Retries are handled by llm_retry, which only retries transient errors
+            max_retries=0,
+            http_async_client=self.http_client
         )
-        self.prompt_template = PromptTemplate(
-            input_variables=["content", "instructions"],
-            template="Content: {content}\n\nInstructions: {instructions}"
+        self.map_llm = UsageReportingChatDeepSeek(
+            api_key=settings.DEEPSEEK_API_KEY,
+            model="deepseek-chat",
+            timeout=600,
+            max_tokens=8000,
+            stream_usage=True,
+            max_retries=0,
+            http_async_client=self.http_client
         )
-        self.chain = self.prompt_template | self.llm
+        self.map_semaphore = asyncio.Semaphore(settings.MAP_REDUCE_CONCURRENCY)
         self.max_input_tokens = 65536
-        self.chars_per_token = 4
         self.min_word_count_part = 1500
         self.max_word_count_part = 3500
         self.min_word_count_total = 3000
         self.max_word_count_total = 7000
-        self.semaphore = asyncio.Semaphore(30)
+        self.limiter = llm_limiter
 
     def _estimate_tokens(self, text: str) -> int:
-        return len(text) // self.chars_per_token + 1
+        return estimate_tokens(text)
 
     def _count_words(self, text: str) -> int:
-        return len(re.findall(r'\w+', text))
+        return count_words(text)
+
+    def _content_budget(self, instructions: str) -> int:
+        return self.max_input_tokens - self._estimate_tokens(instructions) - 1000
 
     def _truncate_content(self, content: str, instructions: str) -> str:
-        prompt_tokens = self._estimate_tokens(instructions)
-        max_content_tokens = self.max_input_tokens - prompt_tokens - 1000
-        max_content_chars = max_content_tokens * self.chars_per_token
-        if len(content) <= max_content_chars:
+        max_content_tokens = self._content_budget(instructions)
+        content_tokens = self._estimate_tokens(content)
+        if content_tokens <= max_content_tokens:
             return content
-        logger.warning(f"Truncating content from {len(content)} to {max_content_chars} chars")
-        return content[:max_content_chars]
+        logger.warning(f"Truncating content from ~{content_tokens} to {max_content_tokens} tokens")
+        return truncate_to_tokens(content, max_content_tokens)
+
+    @llm_retry
+    async def _invoke_map(self, messages: List[BaseMessage], request_tokens: int):
+        async with self.map_semaphore, self.limiter.acquire(request_tokens):
+            return await self.map_llm.ainvoke(messages)
+
+    async def _digest_chunk(self, chunk: str, part: int, total_parts: int, max_words: int) -> str:
+        instructions = CHAPTER_DIGEST_PROMPT.format(part=part, total_parts=total_parts, max_words=max_words)
+        cache_key = response_cache.make_key(self.map_llm.model_name, instructions, chunk)
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        response = await self._invoke_map(build_book_messages(chunk, instructions),
+                                          self._estimate_tokens(chunk) + self.map_llm.max_tokens)
+        digest = response.content if hasattr(response, 'content') else str(response)
+        logger.info(f"Digested part {part}/{total_parts}: {len(chunk)} -> {len(digest)} chars")
+        usage_stats.record(f"digest {part}/{total_parts}", self.map_llm.model_name, usage_from_message(response))
+        await response_cache.set(cache_key, self.map_llm.model_name, digest)
+        return digest
+
+    async def _condense_content(self, content: str, instructions: str, budget: Optional[int] = None) -> str:
+        """Map-reduce content that exceeds the context budget into a digest that fits.
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    async def _generate_content(self, content: str, instructions: str, module_range: str) -> str:
+        The book is split into chapter-aligned chunks, each chunk is digested
+        concurrently (bounded by ``map_semaphore``) with a per-chunk word limit sized
+        so the joined digest fits the budget, and the process repeats on the digest
+        if it is still too long. Content that already fits is returned unchanged.
+        ``budget`` overrides the budget derived from ``max_input_tokens``.
+        """
+        budget = budget or self._content_budget(instructions)
+        for level in range(settings.MAP_REDUCE_MAX_LEVELS):
+            content_tokens = self._estimate_tokens(content)
+            if content_tokens <= budget:
+                return content
+            chunks = split_content(content, min(settings.CHUNK_MAX_TOKENS, budget))
+            # Digest tokens are shared out across chunks; one word is at most ~2 tokens for Cyrillic text
+            max_words = max(200, int(budget * 0.8) // len(chunks) // 2)
+            logger.info(f"Map-reduce level {level + 1}: {content_tokens} tokens in {len(chunks)} chunks, "
+                        f"{max_words} words per digest")
+            digests = await asyncio.gather(*[
+                self._digest_chunk(chunk, i, len(chunks), max_words)
+                for i, chunk in enumerate(chunks, 1)
+            ])
+            content = "\n\n".join(digests)
+        if self._estimate_tokens(content) > budget:
+            logger.warning(f"Truncating digest to {budget} tokens")
+            return truncate_to_tokens(content, budget)
+        return content
+
+    async def _generate_content(self, content: str, instructions: str, module_range: str,
+                                on_progress: Optional[ProgressCallback] = None,
+                                builder: Optional[IncrementalPdfBuilder] = None,
+                                prefix_ready: Optional[asyncio.Event] = None,
+                                word_target: Optional[Tuple[int, int]] = None) -> str:
+        """Generate one response; if ``builder`` is given, it receives the text as it streams in.
+
+        ``word_target`` is the (min, max) word count asked for, by default the per-part target.
+
+        ``prefix_ready`` is set once the prompt prefix has been sent and processed, or the
+        request has ended, so that requests sharing the prefix can wait for the context cache.
+        """
+        try:
+            return await self._generate_response(content, instructions, module_range, on_progress,
+                                                 builder, prefix_ready, word_target)
+        finally:
+            if prefix_ready is not None:
+                prefix_ready.set()
+
+    async def _generate_response(self, content: str, instructions: str, module_range: str,
+                                 on_progress: Optional[ProgressCallback],
+                                 builder: Optional[IncrementalPdfBuilder],
+                                 prefix_ready: Optional[asyncio.Event],
+                                 word_target: Optional[Tuple[int, int]]) -> str:
         logger.info(f"Generating content for modules {module_range}")
-        async with self.semaphore:
-            try:
-                modified_instructions = (
-                    f"{instructions}\n\n"
-                    f"Focus on generating detailed, comprehensive content for modules {module_range}, "
-                    f"targeting approximately {self.min_word_count_part}-{self.max_word_count_part} words. "
-                    f"Ensure all required components (e.g., tables, exercises, case studies) are included with rich examples. "
-                    f"If output is shorter, prioritize depth and specificity over strict word count."
-                )
-                input_data = {"content": content, "instructions": modified_instructions}
-                response = await self.chain.ainvoke(input_data)
+        if builder is not None:
+            builder.reset()
+        min_words, max_words = word_target or (self.min_word_count_part, self.max_word_count_part)
+        modified_instructions = (
+            f"{instructions}\n\n"
+            f"Focus on generating detailed, comprehensive content for modules {module_range}, "
+            f"targeting approximately {min_words}-{max_words} words. "
+            f"Ensure all required components (e.g., tables, exercises, case studies) are included with rich examples. "
+            f"If output is shorter, prioritize depth and specificity over strict word count."
+        )
+        cache_key = response_cache.make_key(self.llm.model_name, modified_instructions, content)
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            if on_progress is not None:
+                await on_progress(module_range, self._count_words(cached))
+            if builder is not None:
+                builder.feed(cached)
+            return cached
+        request_tokens = self._estimate_tokens(content) + self._estimate_tokens(modified_instructions) + self.llm.max_tokens
+        messages = build_book_messages(content, modified_instructions)
+        try:
+            generated_text, model_name = await self._generate_hedged(messages, module_range, request_tokens,
+                                                                     f"{self.llm.model_name}:{max_words}",
+                                                                     on_progress, builder, prefix_ready)
+            word_count = self._count_words(generated_text)
+            logger.info(f"Generated {len(generated_text)} chars, {word_count} words for modules {module_range}")
+            if word_count < min_words // 2:
+                logger.warning(f"Output critically short: {word_count} words (target {min_words})")
+        except Exception as e:
+            logger.error(f"Error generating content for modules {module_range}: {str(e)}")
+            raise
+        # Fallback output from the chat model is not cached as the reasoner's answer
+        if model_name == self.llm.model_name:
+            await response_cache.set(cache_key, self.llm.model_name, generated_text)
+        return generated_text
+
+    async def _call_model(self, llm, messages: List[BaseMessage], module_range: str, request_tokens: int,
+                          latency_key: Optional[str], on_progress: Optional[ProgressCallback] = None,
+                          on_text: Optional[Callable[[str], None]] = None,
+                          prefix_ready: Optional[asyncio.Event] = None,
+                          slot_acquired: Optional[asyncio.Event] = None) -> str:
+        """Make one model request under the global limiter and record its latency and usage.
+
+        ``slot_acquired`` is set once the request holds its limiter slot.
+        """
+        async with self.limiter.acquire(request_tokens):
+            if slot_acquired is not None:
+                slot_acquired.set()
+            started = time.monotonic()
+            if settings.LLM_STREAMING:
+                generated_text, usage = await stream_text(llm, messages, module_range, on_progress,
+                                                          on_text, prefix_ready)
+            else:
+                response = await llm.ainvoke(messages)
                 generated_text = response.content if hasattr(response, 'content') else str(response)
-                word_count = self._count_words(generated_text)
-                logger.info(f"Generated {len(generated_text)} chars, {word_count} words for modules {module_range}")
-                if word_count < 1500:
-                    logger.warning(f"Output critically short: {word_count} words (target {self.min_word_count_part})")
-                return generated_text
-            except Exception as e:
-                logger.error(f"Error generating content for modules {module_range}: {str(e)}")
+                usage = usage_from_message(response)
+                if on_text is not None:
+                    on_text(generated_text)
+            if latency_key is not None:
+                latency_tracker.record(latency_key, time.monotonic() - started)
+        usage_stats.record(f"modules {module_range}", llm.model_name, usage)
+        return generated_text
+
+    def _hedge_target(self, latency_key: str):
+        """Model for a hedged request: the reasoner again, or the chat model when
+        the job deadline would pass before a typical reasoner call could finish."""
+        remaining = time_remaining()
+        typical = latency_tracker.percentile(latency_key, 0.5) or settings.HEDGE_DEFAULT_DELAY_SECONDS
+        if settings.LLM_FALLBACK_TO_CHAT and remaining is not None and remaining < typical:
+            logger.warning(f"{remaining:.0f}s left before the deadline, typical reasoner call takes "
+                           f"{typical:.0f}s; hedging with {self.map_llm.model_name}")
+            return self.map_llm
+        return self.llm
+
+    @llm_retry
+    async def _generate_hedged(self, messages: List[BaseMessage], module_range: str, request_tokens: int, latency_key: str,
+                               on_progress: Optional[ProgressCallback], builder: Optional[IncrementalPdfBuilder],
+                               prefix_ready: Optional[asyncio.Event]) -> Tuple[str, str]:
+        """Generate with the reasoner, issuing a duplicate request if it runs past its usual latency.
+
+        The duplicate starts once the call exceeds the ``HEDGE_PERCENTILE`` latency of
+        similar calls (``HEDGE_DEFAULT_DELAY_SECONDS`` until enough have been seen),
+        counted from when it got its limiter slot, so time spent queueing does not count.
+        No duplicate is sent while other requests are waiting for the limiter. The
+        first successful response wins and the other request is cancelled. Only the
+        original request streams into ``builder`` and ``on_progress``; if the duplicate
+        wins, the builder is refilled with its text. Returns the text and the model that
+        produced it.
+        """
+        if builder is not None:
+            builder.reset()
+        slot_acquired = asyncio.Event()
+        primary = asyncio.create_task(self._call_model(
+            self.llm, messages, module_range, request_tokens, latency_key, on_progress,
+            builder.feed if builder is not None else None, prefix_ready, slot_acquired
+        ))
+        tasks = {primary: self.llm.model_name}
+        try:
+            if settings.LLM_HEDGING_ENABLED:
+                delay = latency_tracker.percentile(latency_key, settings.HEDGE_PERCENTILE) or settings.HEDGE_DEFAULT_DELAY_SECONDS
+                slot_wait = asyncio.create_task(slot_acquired.wait())
+                try:
+                    await asyncio.wait({primary, slot_wait}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    slot_wait.cancel()
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done and self.limiter.waiting:
+                    logger.info(f"Modules {module_range} still generating after {delay:.0f}s, not hedging: "
+                                f"{self.limiter.waiting} requests are waiting for the limiter")
+                elif not done:
+                    llm = self._hedge_target(latency_key)
+                    logger.warning(f"Modules {module_range} still generating after {delay:.0f}s, "
+                                   f"sending a hedged request to {llm.model_name}")
+                    hedge = asyncio.create_task(self._call_model(
+                        llm, messages, f"{module_range}-hedge", request_tokens,
+                        latency_key if llm is self.llm else None
+                    ))
+                    tasks[hedge] = llm.model_name
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=lambda t: t is not primary):
+                    if task.exception() is not None:
+                        logger.warning(f"Request to {tasks[task]} for modules {module_range} failed: {str(task.exception())}")
+                        continue
+                    if task is not primary:
+                        logger.info(f"Hedged request to {tasks[task]} won for modules {module_range}")
+                        if builder is not None:
+                            builder.reset()
+                            builder.feed(task.result())
+                    return task.result(), tasks[task]
+            return primary.result(), tasks[primary]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _shrink_content(self, content: str, instructions: str, module_range: str, error: Exception) -> str:
+        """Condense content after a request was rejected for exceeding the context window.
+
+        The content budget is scaled by how far the request overshot the provider's limit,
+        as reported in the error, and the content is condensed with map-reduce to fit it.
+        """
+        content_tokens = self._estimate_tokens(content)
+        ratio = context_overflow_ratio(error) or 0.5
+        budget = max(1000, int(content_tokens * min(ratio, 1.0) * 0.9))
+        logger.warning(f"Context length exceeded for modules {module_range}; "
+                       f"condensing content from ~{content_tokens} to {budget} tokens")
+        return await self._condense_content(content, instructions, budget)
+
+    async def _generate_within_context(self, content: str, instructions: str, module_range: str,
+                                       on_progress: Optional[ProgressCallback] = None,
+                                       builder: Optional[IncrementalPdfBuilder] = None,
+                                       prefix_ready: Optional[asyncio.Event] = None,
+                                       word_target: Optional[Tuple[int, int]] = None) -> Tuple[str, str]:
+        """Generate a response, condensing the content once if it is rejected as too long.
+
+        Returns the generated text and the content it was generated from.
+        """
+        try:
+            generated_text = await self._generate_content(content, instructions, module_range,
+                                                          on_progress, builder, prefix_ready, word_target)
+        except Exception as e:
+            # Transient errors were already retried and anything else will fail again;
+            # only a context-length error is worth another request, with less content
+            if classify_error(e) != TOO_LONG:
                 raise
+            content = await self._shrink_content(content, instructions, module_range, e)
+            generated_text = await self._generate_content(content, instructions, module_range,
+                                                          on_progress, builder, word_target=word_target)
+        return generated_text, content
+
+    async def _continue_part(self, content: str, instructions: str, module_range: str, generated_text: str,
+                             word_count: int, max_words: int, on_progress: Optional[ProgressCallback],
+                             builder: Optional[IncrementalPdfBuilder], min_words: int) -> str:
+        """Ask the model to extend a short answer, sending only the tail of what it wrote.
+
+        The book prefix is the same as in the first request, so it is served from the
+        context cache; the continuation is appended to the text and to ``builder``.
+        """
+        for round_number in range(1, settings.CONTINUATION_MAX_ROUNDS + 1):
+            logger.warning(f"Part output short: {word_count} words (target {min_words}) for modules "
+                           f"{module_range}; requesting continuation {round_number}")
+            continuation_instructions = instructions + "\n" + CONTINUATION_PROMPT.format(
+                module_range=module_range,
+                words=word_count,
+                tail=generated_text[-settings.CONTINUATION_TAIL_CHARS:],
+                min_words=max(200, min_words - word_count),
+                max_words=max(400, max_words - word_count)
+            )
+            prior_words = word_count
 
-    async def _generate_part(self, content: str, instructions: str, module_range: str) -> str:
+            async def continued_progress(_, words):
+                await on_progress(module_range, prior_words + words)
+
+            continuation = await self._generate_content(
+                content, continuation_instructions, module_range,
+                continued_progress if on_progress is not None else None,
+                word_target=(max(200, min_words - word_count), max(400, max_words - word_count))
+            )
+            suffix = continuation_suffix(generated_text, continuation)
+            generated_text += suffix
+            if builder is not None:
+                builder.feed(suffix)
+            word_count = self._count_words(generated_text)
+            if word_count >= min_words:
+                break
+        return generated_text
+
+    async def _generate_part(self, content: str, instructions: str, module_range: str,
+                             on_progress: Optional[ProgressCallback] = None,
+                             builder: Optional[IncrementalPdfBuilder] = None,
+                             prefix_ready: Optional[asyncio.Event] = None,
+                             word_target: Optional[Tuple[int, int]] = None) -> str:
         logger.info(f"Generating part for modules {module_range}")
-        truncated_content = self._truncate_content(content, instructions)
-        try:
-            generated_text = await self._generate_content(truncated_content, instructions, module_range)
+        min_words, max_words = word_target or (self.min_word_count_part, self.max_word_count_part)
+        part_content = self._truncate_content(content, instructions)
+        generated_text, part_content = await self._generate_within_context(
+            part_content, instructions, module_range, on_progress, builder, prefix_ready, word_target
+        )
+        word_count = self._count_words(generated_text)
+        if word_count < min_words and generated_text.strip():
+            generated_text = await self._continue_part(part_content, instructions, module_range, generated_text,
+                                                       word_count, max_words, on_progress, builder, min_words)
             word_count = self._count_words(generated_text)
-            if word_count >= self.min_word_count_part:
-                logger.info(f"Part meets target: {word_count} words for modules {module_range}")
-                return generated_text
-            logger.warning(f"Part output short: {word_count} words (target {self.min_word_count_part}). Attempting chunking.")
-        except Exception as e:
-            logger.warning(f"Part generation failed: {str(e)}. Attempting chunking.")
-
-        max_chunk_chars = 50000
-        content_chunks = [content[i:i + max_chunk_chars] for i in range(0, len(content), max_chunk_chars)]
-        logger.info(f"Split into {len(content_chunks)} chunks of ~{max_chunk_chars} chars for modules {module_range}")
-
-        chunk_module_ranges = [f"{module_range}-chunk{i+1}" for i in range(len(content_chunks))]
-        tasks = [
-            self._generate_content(chunk, instructions, chunk_range)
-            for chunk, chunk_range in zip(content_chunks, chunk_module_ranges)
-        ]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        generated_text = ""
-        total_word_count = 0
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                logger.warning(f"Chunk {i + 1} (modules {chunk_module_ranges[i]}) failed: {str(result)}. Skipping.")
-                continue
-            generated_text += result + "\n\n"
-            chunk_word_count = self._count_words(result)
-            total_word_count += chunk_word_count
-            logger.info(f"Chunk {i + 1} generated {chunk_word_count} words for modules {chunk_module_ranges[i]}")
-
-        logger.info(f"Combined part output: {total_word_count} words for modules {module_range}")
-        if total_word_count < 1500:
-            logger.warning(f"Combined part critically short: {total_word_count} words (target {self.min_word_count_part})")
+        if word_count >= min_words:
+            logger.info(f"Part meets target: {word_count} words for modules {module_range}")
+        else:
+            logger.warning(f"Part still short after continuation: {word_count} words (target {min_words}) "
+                           f"for modules {module_range}")
         return generated_text
 
-    async def generate_pdf_parts(self, content: str, instructions: str, output_path: str) -> list:
-        logger.info(f"Starting PDF generation for {output_path}")
+    async def _run_module_job(self, job: ModuleJob, total_modules: int, content: str, instructions: str,
+                              on_progress: Optional[ProgressCallback], builder: IncrementalPdfBuilder,
+                              prefix_ready: asyncio.Event, wait_for_prefix: bool) -> str:
+        """Generate one planned job within ``LLM_JOB_DEADLINE_SECONDS``.
+
+        Jobs after the first wait until the shared prefix has been processed by the first
+        request: DeepSeek only serves a prefix from its context cache after a request
+        containing it has been processed, so jobs started at the same moment would all miss it.
+        """
+        if wait_for_prefix:
+            try:
+                await asyncio.wait_for(prefix_ready.wait(), settings.PREFIX_WARMUP_SECONDS)
+            except asyncio.TimeoutError:
+                logger.info(f"Prefix not ready after {settings.PREFIX_WARMUP_SECONDS}s, "
+                            f"starting modules {job.module_range} without the context cache")
+        job_instructions = f"{instructions}\n\n{job.scope_instructions(total_modules)}"
+        return await run_with_deadline(
+            self._generate_part(content, job_instructions, job.module_range, on_progress, builder,
+                                prefix_ready, (job.min_words, job.max_words)),
+            settings.LLM_JOB_DEADLINE_SECONDS, f"Modules {job.module_range}"
+        )
+
+    @staticmethod
+    async def _layout_pdf(flowables: list, output_path: PdfOutput) -> PdfOutput:
+        """Paginate in the process pool, keeping layout off the bot's event loop and GIL."""
+        data = await run_cpu_bound(layout_pdf_bytes, flowables)
+        return await asyncio.to_thread(write_pdf, data, output_path)
+
+    async def generate_pdf_parts(self, content: str, instructions: str, output_path: PdfOutput,
+                                 on_progress: Optional[ProgressCallback] = None) -> list:
+        """Generate the prompt's modules as parallel jobs and render them, in order, as one PDF.
+
+        The number of jobs comes from the total word target, ``MODULE_JOB_MAX_WORDS`` and
+        the concurrency budget; see :func:`plan_module_jobs`.
+        """
+        logger.info(f"Starting PDF generation for {output_label(output_path)}")
         try:
-            async with self.semaphore:
-                tasks = [
-                    self._generate_part(content, instructions, "1-4"),
-                    self._generate_part(content, instructions, "5-8")
-                ]
-                parts = await asyncio.gather(*tasks, return_exceptions=True)
-            
-
-            for i, part in enumerate(parts, 1):
+            total_modules = count_modules(instructions)
+            jobs = plan_module_jobs(total_modules, self.min_word_count_total, self.max_word_count_total,
+                                    settings.MODULE_JOB_MAX_WORDS,
+                                    min(settings.MODULE_JOBS_MAX_PARALLEL, settings.LLM_MAX_IN_FLIGHT))
+            if not jobs:
+                logger.info("No modules found in the prompt, generating in a single request")
+                return [await self.generate_pdf(content, instructions, output_path, on_progress)]
+            content = await self._condense_content(content, instructions)
+            # Each job is laid out section by section while it streams in
+            builders = [IncrementalPdfBuilder() for _ in jobs]
+            prefix_ready = asyncio.Event()
+            tasks = [
+                self._run_module_job(job, total_modules, content, instructions, on_progress, builder,
+                                     prefix_ready, i > 0)
+                for i, (job, builder) in enumerate(zip(jobs, builders))
+            ]
+            parts = await asyncio.gather(*tasks, return_exceptions=True)
+
+            for job, part in zip(jobs, parts):
                 if isinstance(part, Exception):
-                    logger.error(f"Error generating part {i} (Modules {['1-4', '5-8'][i-1]}): {str(part)}")
+                    logger.error(f"Error generating modules {job.module_range}: {str(part)}")
                     raise part
 
             total_word_count = sum(self._count_words(part) for part in parts)
@@ -131,27 +530,33 @@ class DeepSeekService:
             if total_word_count < self.min_word_count_total:
                 logger.warning(f"Total output short: {total_word_count} words (target {self.min_word_count_total})")
 
-
-            combined_content = parts[0] + "\n\n---\n\n" + parts[1]
-            logger.info(f"Rendering single PDF at {output_path}")
-            pdf_path = generate_pdf(combined_content, output_path)
-            logger.info(f"PDF generated at {pdf_path}")
+            flowables = await builders[0].finish()
+            for builder in builders[1:]:
+                flowables += section_break_flowables() + await builder.finish()
+            logger.info(f"Rendering single PDF at {output_label(output_path)}")
+            pdf_path = await self._layout_pdf(flowables, output_path)
+            logger.info(f"PDF generated at {output_label(pdf_path)}")
             return [pdf_path]
         except Exception as e:
             logger.error(f"Error in PDF generation: {str(e)}")
             raise
 
-    async def generate_pdf(self, content: str, instructions: str, output_path: str) -> str:
-        logger.info(f"Starting single PDF generation for {output_path}")
+    async def generate_pdf(self, content: str, instructions: str, output_path: PdfOutput,
+                           on_progress: Optional[ProgressCallback] = None) -> PdfOutput:
+        logger.info(f"Starting single PDF generation for {output_label(output_path)}")
         try:
-            truncated_content = self._truncate_content(content, instructions)
-            generated_text = await self._generate_content(truncated_content, instructions, "all")
+            condensed_content = await self._condense_content(content, instructions)
+            builder = IncrementalPdfBuilder()
+            generated_text, _ = await run_with_deadline(
+                self._generate_within_context(condensed_content, instructions, "all", on_progress, builder),
+                settings.LLM_JOB_DEADLINE_SECONDS, "Generation"
+            )
             word_count = self._count_words(generated_text)
             logger.info(f"Generated {word_count} words for single PDF")
             if word_count < 1500:
                 logger.warning(f"Single PDF output short: {word_count} words (target 2500-5000)")
-            pdf_path = generate_pdf(generated_text, output_path)
-            logger.info(f"PDF generated at {pdf_path}")
+            pdf_path = await self._layout_pdf(await builder.finish(), output_path)
+            logger.info(f"PDF generated at {output_label(pdf_path)}")
             return pdf_path
         except Exception as e:
             logger.error(f"Error in single PDF generation: {str(e)}")
@@ -1,36 +1,426 @@
-import ebooklib
-from ebooklib import epub
+import asyncio
 import html2text
+import lxml.html
+import hashlib
+import json
 import logging
+import os
+import posixpath
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote
+from lxml import etree
+from bot.config.settings import settings
+from bot.services.executor import run_cpu_bound
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def process_epub(epub_path: str) -> str:
-    """Process EPUB to extract clean chapter text, prioritizing main content."""
+WORD_RE = re.compile(r'\w+')
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Return the hex SHA-256 digest of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+HTML2TEXT_BACKEND = "html2text"
+LXML_BACKEND = "lxml"
+TEXT_BACKENDS = (HTML2TEXT_BACKEND, LXML_BACKEND)
+
+LXML_SKIPPED_TAGS = {"head", "script", "style", "img", "svg", "math", "table", "figure", "object", "video", "audio"}
+LXML_BLOCK_TAGS = {
+    "p", "div", "section", "article", "aside", "header", "footer", "main", "blockquote",
+    "pre", "dl", "dt", "dd", "ul", "ol", "hr", "body", "figcaption", "address", "center",
+}
+LXML_HEADING_LEVELS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+
+def _html2text_converter() -> Callable[[bytes], str]:
+    h = html2text.HTML2Text()
+    h.ignore_links = True
+    h.ignore_images = True
+    h.ignore_tables = True
+    h.body_width = 0
+    return lambda content: h.handle(content.decode('utf-8', errors='ignore')).strip()
+
+def _lxml_to_text(content: bytes) -> str:
+    """Convert a chapter document to plain text with lxml's C parser.
+
+    Headings become markdown ``#`` lines and paragraphs and list items are separated
+    by blank lines, matching html2text's layout. Images, tables, scripts and link
+    targets are dropped; link text is kept.
+    """
+    if not content.strip():
+        return ""
+    root = lxml.html.fromstring(content)
+    blocks: List[str] = []
+    buffer: List[str] = []
+
+    def flush(prefix: str = "") -> None:
+        lines = (" ".join(line.split()) for line in "".join(buffer).split("\n"))
+        text = "\n".join(line for line in lines if line)
+        buffer.clear()
+        if text:
+            blocks.append(prefix + text)
+
+    def walk(element, depth: int) -> None:
+        tag = element.tag.lower() if isinstance(element.tag, str) else None
+        if tag is None or tag in LXML_SKIPPED_TAGS:
+            pass
+        elif tag in LXML_HEADING_LEVELS:
+            flush()
+            buffer.append(element.text_content())
+            flush("#" * LXML_HEADING_LEVELS[tag] + " ")
+        elif tag == "li":
+            flush()
+            parent = element.getparent()
+            marker = "*"
+            if parent is not None and parent.tag == "ol":
+                marker = f"{sum(1 for sibling in element.itersiblings('li', preceding=True)) + 1}."
+            prefix = "  " * depth + marker + " "
+            buffer.append(element.text or "")
+            for child in element:
+                if isinstance(child.tag, str) and child.tag in ("ul", "ol"):
+                    flush(prefix)
+                    prefix = None
+                    walk(child, depth + 1)
+                else:
+                    walk(child, depth)
+            if prefix is not None:
+                flush(prefix)
+        elif tag == "br":
+            buffer.append("\n")
+        elif tag in LXML_BLOCK_TAGS:
+            flush()
+            buffer.append(element.text or "")
+            for child in element:
+                walk(child, depth)
+            flush()
+        else:
+            buffer.append(element.text or "")
+            for child in element:
+                walk(child, depth)
+        if element.tail:
+            buffer.append(element.tail)
+
+    body = root.find(".//body")
+    walk(body if body is not None else root, 0)
+    flush()
+    return "\n\n".join(blocks)
+
+def _make_converter(backend: str) -> Callable[[bytes], str]:
+    if backend == HTML2TEXT_BACKEND:
+        return _html2text_converter()
+    if backend == LXML_BACKEND:
+        return _lxml_to_text
+    raise ValueError(f"Unknown EPUB text backend {backend!r}, expected one of {TEXT_BACKENDS}")
+
+@dataclass
+class Chapter:
+    """A spine document with its TOC title and its position in the joined book text."""
+    title: str
+    href: str
+    text: str
+    word_count: int
+    start: int
+    end: int
+
+class ExtractionCache:
+    """LRU cache of extracted chapters keyed by the SHA-256 of the EPUB bytes.
+
+    Entries are evicted when either the entry count or the total number of cached
+    characters exceeds its limit. When ``cache_dir`` is set, extractions are also
+    written to disk and reloaded on a memory miss, so they survive restarts.
+    """
+
+    def __init__(self, max_entries: int, max_chars: int, cache_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.cache_dir = cache_dir
+        self._entries: "OrderedDict[str, List[Chapter]]" = OrderedDict()
+        self._total_chars = 0
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[List[Chapter]]:
+        with self._lock:
+            chapters = self._entries.get(key)
+            if chapters is not None:
+                self._entries.move_to_end(key)
+                return chapters
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._disk_path(key), 'r', encoding='utf-8') as f:
+                chapters = [Chapter(**record) for record in json.load(f)]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Failed to read cached extraction {key}: {str(e)}")
+            return None
+        self._remember(key, chapters)
+        return chapters
+
+    def put(self, key: str, chapters: List[Chapter]) -> None:
+        self._remember(key, chapters)
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump([asdict(chapter) for chapter in chapters], f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to persist extraction {key}: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _size(chapters: List[Chapter]) -> int:
+        return sum(len(chapter.text) for chapter in chapters)
+
+    def _remember(self, key: str, chapters: List[Chapter]) -> None:
+        size = self._size(chapters)
+        if size > self.max_chars:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_chars -= self._size(previous)
+            self._entries[key] = chapters
+            self._total_chars += size
+            while self._entries and (len(self._entries) > self.max_entries or self._total_chars > self.max_chars):
+                _, evicted = self._entries.popitem(last=False)
+                self._total_chars -= self._size(evicted)
+
+extraction_cache = ExtractionCache(
+    max_entries=settings.EPUB_CACHE_MAX_ENTRIES,
+    max_chars=settings.EPUB_CACHE_MAX_CHARS,
+    cache_dir=settings.EPUB_CACHE_DIR
+)
+
+CONTAINER_PATH = "META-INF/container.xml"
+NAMESPACES = {
+    "container": "urn:oasis:names:tc:opendocument:xmlns:container",
+    "opf": "http://www.idpf.org/2007/opf",
+    "ncx": "http://www.daisy.org/z3986/2005/ncx/",
+    "xhtml": "http://www.w3.org/1999/xhtml",
+    "epub": "http://www.idpf.org/2007/ops",
+}
+DOCUMENT_MEDIA_TYPES = ("application/xhtml+xml", "text/html")
+NCX_MEDIA_TYPE = "application/x-dtbncx+xml"
+# OPF guide / EPUB 3 landmark types that mark front and back matter rather than chapters
+SKIPPED_LANDMARK_TYPES = {
+    "cover", "toc", "title-page", "titlepage", "copyright-page", "colophon",
+    "loi", "lot", "index", "bibliography", "other.ms-coverimage-standard",
+}
+CHAPTER_SEPARATOR = "\n"
+MIN_CHAPTER_CHARS = 200
+
+@dataclass
+class _SpineEntry:
+    href: str
+    media_type: str
+    linear: bool
+    properties: List[str]
+
+def _strip_fragment(href: str) -> str:
+    return href.split("#", 1)[0]
+
+def _resolve(base_path: str, href: str) -> str:
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base_path), unquote(_strip_fragment(href))))
+
+def _read_package(archive: zipfile.ZipFile) -> Tuple[str, etree._Element]:
+    container = etree.fromstring(archive.read(CONTAINER_PATH))
+    opf_path = container.find(".//container:rootfile", NAMESPACES).get("full-path")
+    return opf_path, etree.fromstring(archive.read(opf_path))
+
+def _read_titles(archive: zipfile.ZipFile, nav_path: Optional[str], ncx_path: Optional[str]) -> Tuple[Dict[str, str], set]:
+    """Map document paths to TOC titles and collect landmark documents to skip.
+
+    The EPUB 3 navigation document is preferred; the EPUB 2 NCX is used when the
+    book has no nav document or its TOC is empty.
+    """
+    titles: Dict[str, str] = {}
+    skipped: set = set()
+    epub_type = f"{{{NAMESPACES['epub']}}}type"
+    if nav_path:
+        try:
+            nav_doc = etree.fromstring(archive.read(nav_path), etree.XMLParser(recover=True))
+            for nav in nav_doc.iter(f"{{{NAMESPACES['xhtml']}}}nav"):
+                nav_type = nav.get(epub_type, "")
+                for link in nav.iter(f"{{{NAMESPACES['xhtml']}}}a"):
+                    href = link.get("href")
+                    if not href:
+                        continue
+                    path = _resolve(nav_path, href)
+                    if "toc" in nav_type.split():
+                        title = " ".join("".join(link.itertext()).split())
+                        if title:
+                            titles.setdefault(path, title)
+                    elif "landmarks" in nav_type.split() and set(link.get(epub_type, "").split()) & SKIPPED_LANDMARK_TYPES:
+                        skipped.add(path)
+        except (KeyError, etree.XMLSyntaxError) as e:
+            logger.warning(f"Failed to read navigation document {nav_path}: {str(e)}")
+    if not titles and ncx_path:
+        try:
+            ncx = etree.fromstring(archive.read(ncx_path), etree.XMLParser(recover=True))
+            for point in ncx.iterfind(".//ncx:navPoint", NAMESPACES):
+                label = point.find("ncx:navLabel/ncx:text", NAMESPACES)
+                content = point.find("ncx:content", NAMESPACES)
+                if label is None or content is None or not content.get("src"):
+                    continue
+                title = " ".join("".join(label.itertext()).split())
+                if title:
+                    titles.setdefault(_resolve(ncx_path, content.get("src")), title)
+        except (KeyError, etree.XMLSyntaxError) as e:
+            logger.warning(f"Failed to read NCX {ncx_path}: {str(e)}")
+    return titles, skipped
+
+def _read_spine(archive: zipfile.ZipFile) -> Tuple[List[_SpineEntry], Dict[str, str], set]:
+    """Return the spine, TOC titles and skipped landmarks without reading chapter bodies."""
+    opf_path, package = _read_package(archive)
+    manifest: Dict[str, _SpineEntry] = {}
+    nav_path = None
+    for item in package.iterfind("opf:manifest/opf:item", NAMESPACES):
+        entry = _SpineEntry(
+            href=_resolve(opf_path, item.get("href", "")),
+            media_type=item.get("media-type", ""),
+            linear=True,
+            properties=item.get("properties", "").split()
+        )
+        manifest[item.get("id")] = entry
+        if "nav" in entry.properties:
+            nav_path = entry.href
+    spine_element = package.find("opf:spine", NAMESPACES)
+    ncx_path = None
+    if spine_element is not None and spine_element.get("toc") in manifest:
+        ncx_path = manifest[spine_element.get("toc")].href
+    elif spine_element is not None:
+        ncx_path = next((e.href for e in manifest.values() if e.media_type == NCX_MEDIA_TYPE), None)
+    spine = []
+    for ref in package.iterfind("opf:spine/opf:itemref", NAMESPACES):
+        entry = manifest.get(ref.get("idref"))
+        if entry is not None:
+            spine.append(_SpineEntry(entry.href, entry.media_type, ref.get("linear", "yes") != "no", entry.properties))
+    titles, skipped = _read_titles(archive, nav_path, ncx_path)
+    for reference in package.iterfind("opf:guide/opf:reference", NAMESPACES):
+        if reference.get("type", "").lower() in SKIPPED_LANDMARK_TYPES and reference.get("href"):
+            skipped.add(_resolve(opf_path, reference.get("href")))
+    if nav_path:
+        skipped.add(nav_path)
+    return spine, titles, skipped
+
+def iter_epub_chapters(epub_path: str, max_chars: Optional[int] = None, backend: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+    """Yield ``(chapter_title, text)`` in spine order until ``max_chars`` characters have been produced.
+
+    Non-linear spine items, the navigation document and documents marked as cover,
+    TOC, title or copyright pages by the guide or landmarks are skipped. Chapter
+    files are read from the archive and converted one at a time, and reading stops
+    as soon as the budget is spent, so the tail of a large book is never
+    decompressed or parsed. The last chapter is cut to fit the remaining budget.
+    ``backend`` selects the HTML-to-text converter (``EPUB_TEXT_BACKEND`` by default).
+    """
+    for chapter in _iter_chapter_records(epub_path, max_chars, backend):
+        yield chapter.title, chapter.text
+
+def _iter_chapter_records(epub_path: str, max_chars: Optional[int], backend: Optional[str]) -> Iterator[Chapter]:
+    budget = settings.EPUB_MAX_CHARS if max_chars is None else max_chars
+    convert = _make_converter(backend or settings.EPUB_TEXT_BACKEND)
+    offset = 0
+    title = None
+    with zipfile.ZipFile(epub_path) as archive:
+        spine, titles, skipped = _read_spine(archive)
+        for entry in spine:
+            if entry.media_type not in DOCUMENT_MEDIA_TYPES or not entry.linear or entry.href in skipped:
+                continue
+            # Untitled documents continue the chapter that precedes them in the TOC
+            title = titles.get(entry.href, title or posixpath.splitext(posixpath.basename(entry.href))[0])
+            try:
+                content = archive.read(entry.href)
+            except KeyError:
+                logger.warning(f"Spine entry {entry.href} is missing from the archive")
+                continue
+            cleaned_text = convert(content)
+            if not cleaned_text or len(cleaned_text) <= MIN_CHAPTER_CHARS:
+                continue
+            start = offset + len(CHAPTER_SEPARATOR) if offset else 0
+            remaining = budget - start
+            if remaining <= 0:
+                return
+            truncated = len(cleaned_text) >= remaining
+            if truncated:
+                logger.warning(f"Character budget of {budget} reached at {entry.href}. Skipping the rest of the book.")
+                cleaned_text = cleaned_text[:remaining]
+            offset = start + len(cleaned_text)
+            yield Chapter(title, entry.href, cleaned_text, len(WORD_RE.findall(cleaned_text)), start, offset)
+            if truncated:
+                return
+
+def extract_chapters(epub_path: str, max_chars: Optional[int] = None, backend: Optional[str] = None) -> List[Chapter]:
+    """Extract the book's chapters in reading order with titles, word counts and offsets."""
     try:
-        book = epub.read_epub(epub_path)
-        text = ""
-        h = html2text.HTML2Text()
-        h.ignore_links = True
-        h.ignore_images = True
-        h.ignore_tables = True
-        h.body_width = 0
-        for item in book.get_items_of_type(ebooklib.ITEM_DOCUMENT):
-            name = item.get_name().lower()
-            if not any(x in name for x in ["toc", "nav", "meta", "cover", "title", "copyright", "preface", "appendix", "notes"]):
-                content = item.get_content().decode('utf-8', errors='ignore')
-                cleaned_text = h.handle(content).strip()
-                if cleaned_text and len(cleaned_text) > 200:
-                    text += cleaned_text + "\n"
-        logger.info(f"Processed EPUB content length: {len(text)} characters")
-        if not text.strip():
+        chapters = list(_iter_chapter_records(epub_path, max_chars, backend))
+        total_chars = chapters[-1].end if chapters else 0
+        logger.info(f"Processed EPUB content length: {total_chars} characters in {len(chapters)} chapters")
+        if not chapters:
             logger.error("No content extracted from EPUB")
             raise ValueError("Failed to extract EPUB content")
-        if len(text) > 150000:
-            logger.warning(f"Content size {len(text)} chars exceeds preferred 150,000. Truncating.")
-            text = text[:150000]
-        return text.strip()
+        return chapters
     except Exception as e:
         logger.error(f"Error processing EPUB: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+def join_chapters(chapters: List[Chapter]) -> str:
+    """Join chapters into the book text that their ``start``/``end`` offsets refer to."""
+    return CHAPTER_SEPARATOR.join(chapter.text for chapter in chapters)
+
+def extract_epub_text(epub_path: str, max_chars: Optional[int] = None) -> str:
+    """Extract clean chapter text from an EPUB, prioritizing main content."""
+    return join_chapters(extract_chapters(epub_path, max_chars))
+
+def _cache_key(digest: str, budget: int) -> str:
+    return f"{digest}-{budget}-{settings.EPUB_TEXT_BACKEND}"
+
+def load_chapters(epub_path: str, max_chars: Optional[int] = None) -> List[Chapter]:
+    """Return the chapters of an EPUB, reusing a cached extraction of identical bytes."""
+    budget = settings.EPUB_MAX_CHARS if max_chars is None else max_chars
+    key = _cache_key(file_sha256(epub_path), budget)
+    chapters = extraction_cache.get(key)
+    if chapters is not None:
+        logger.info(f"Extraction cache hit for {epub_path} ({key[:12]})")
+        return chapters
+    chapters = extract_chapters(epub_path, budget)
+    extraction_cache.put(key, chapters)
+    return chapters
+
+async def load_chapters_async(epub_path: str, max_chars: Optional[int] = None) -> List[Chapter]:
+    """Like :func:`load_chapters`, but hashes in a thread and extracts in the process pool."""
+    budget = settings.EPUB_MAX_CHARS if max_chars is None else max_chars
+    key = _cache_key(await asyncio.to_thread(file_sha256, epub_path), budget)
+    chapters = extraction_cache.get(key)
+    if chapters is not None:
+        logger.info(f"Extraction cache hit for {epub_path} ({key[:12]})")
+        return chapters
+    chapters = await run_cpu_bound(extract_chapters, epub_path, budget)
+    extraction_cache.put(key, chapters)
+    return chapters
+
+def process_epub(epub_path: str, max_chars: Optional[int] = None) -> str:
+    """Return the cleaned text of an EPUB, reusing a cached extraction of identical bytes."""
+    return join_chapters(load_chapters(epub_path, max_chars))
+
+async def process_epub_async(epub_path: str, max_chars: Optional[int] = None) -> str:
+    """Like :func:`process_epub`, but hashes in a thread and extracts in the process pool."""
+    return join_chapters(await load_chapters_async(epub_path, max_chars))
@@ -0,0 +1,36 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+from bot.config.settings import settings
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+def get_executor() -> ProcessPoolExecutor:
+    """Return the shared process pool for CPU-bound work, creating it on first use."""
+    global _executor
+    if _executor is None:
+        workers = settings.CPU_WORKERS or os.cpu_count() or 1
+        # spawn avoids forking a process that already runs an event loop and HTTP threads
+        _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        logger.info(f"Started process pool with {workers} workers")
+    return _executor
+
+async def run_cpu_bound(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a picklable top-level function in the process pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+def shutdown_executor() -> None:
+    """Stop the process pool, cancelling work that has not started yet."""
+    global _executor
+    if _executor is not None:
+        logger.info("Shutting down process pool")
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
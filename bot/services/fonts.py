@@ -0,0 +1,60 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+import logging
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Resolved from the package, so rendering works whatever the working directory is
+FONT_DIR = Path(__file__).resolve().parent.parent / "fonts"
+FAMILY_NAME = "DejaVuSans"
+# ReportLab family slot -> (font name, file); DejaVu Sans covers Cyrillic
+FACES = {
+    "normal": ("DejaVuSans", "DejaVuSans.ttf"),
+    "bold": ("DejaVuSans-Bold", "DejaVuSans-Bold.ttf"),
+    "italic": ("DejaVuSans-Oblique", "DejaVuSans-Oblique.ttf"),
+    "boldItalic": ("DejaVuSans-BoldOblique", "DejaVuSans-BoldOblique.ttf"),
+}
+FALLBACK_FACES = {
+    "normal": "Helvetica",
+    "bold": "Helvetica-Bold",
+    "italic": "Helvetica-Oblique",
+    "boldItalic": "Helvetica-BoldOblique",
+}
+
+@dataclass(frozen=True)
+class FontFamily:
+    regular: str
+    bold: str
+    italic: str
+    bold_italic: str
+
+@lru_cache(maxsize=None)
+def register_fonts() -> FontFamily:
+    """Register the DejaVu Sans faces and their family once per process.
+
+    With the family registered, ``<b>`` and ``<i>`` markup in paragraphs picks the
+    bold and oblique faces. A missing style falls back to the regular face; if the
+    regular face itself is missing, Helvetica is used (no Cyrillic support).
+    """
+    regular_path = FONT_DIR / FACES["normal"][1]
+    try:
+        if not regular_path.exists():
+            raise FileNotFoundError(f"Font file {regular_path} not found")
+        names = {}
+        for slot, (name, filename) in FACES.items():
+            path = FONT_DIR / filename
+            if not path.exists():
+                logger.warning(f"Font file {path} not found, using {regular_path.name} for {slot}")
+                path = regular_path
+            pdfmetrics.registerFont(TTFont(name, str(path)))
+            names[slot] = name
+        pdfmetrics.registerFontFamily(FAMILY_NAME, **names)
+        logger.info(f"Font family {FAMILY_NAME} registered from {FONT_DIR}")
+    except Exception as e:
+        logger.error(f"Error registering fonts: {str(e)}, falling back to Helvetica (no Cyrillic support)")
+        names = FALLBACK_FACES
+    return FontFamily(names["normal"], names["bold"], names["italic"], names["boldItalic"])
@@ -0,0 +1,49 @@
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from typing import Awaitable, Deque, Dict, Optional, TypeVar
+import asyncio
+import logging
+import time
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class LatencyTracker:
+    """Rolling window of call durations per key, used to pick hedging delays."""
+
+    def __init__(self, window: int = 200, min_samples: int = 10):
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, key: str, seconds: float):
+        self._samples[key].append(seconds)
+
+    def percentile(self, key: str, q: float) -> Optional[float]:
+        """The ``q`` quantile of recent durations, or None until ``min_samples`` are recorded."""
+        samples = self._samples.get(key)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+latency_tracker = LatencyTracker()
+
+_deadline: ContextVar[Optional[float]] = ContextVar("llm_deadline", default=None)
+
+def time_remaining() -> Optional[float]:
+    """Seconds left until the deadline of the current job, or None outside :func:`run_with_deadline`."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+async def run_with_deadline(awaitable: Awaitable[T], seconds: float, description: str) -> T:
+    """Await ``awaitable``, cancelling it after ``seconds``; calls inside can check :func:`time_remaining`."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        return await asyncio.wait_for(awaitable, seconds)
+    except asyncio.TimeoutError:
+        logger.error(f"{description} not finished within {seconds}s")
+        raise TimeoutError(f"{description} not finished within {seconds}s")
+    finally:
+        _deadline.reset(token)
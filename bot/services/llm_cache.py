@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Optional
+import zstandard
+from sqlalchemy import Column, Float, Integer, LargeBinary, MetaData, String, Table, create_engine, delete, func, select, update
+from sqlalchemy.engine import Engine, make_url
+from bot.config.settings import settings
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+responses = Table(
+    "llm_responses", metadata,
+    Column("key", String(64), primary_key=True),
+    Column("model", String(64), nullable=False),
+    Column("value", LargeBinary, nullable=False),
+    Column("size", Integer, nullable=False),
+    Column("created_at", Float, nullable=False),
+    Column("accessed_at", Float, nullable=False, index=True),
+)
+
+class ResponseCache:
+    """SQLite-backed cache of model responses with TTL and size-based LRU eviction.
+
+    Responses are stored zstd-compressed. Keys are derived from the model name, the
+    full prompt and a hash of the book content, so identical requests from any user
+    are served without calling the API. Database work runs in worker threads, so
+    each thread gets its own zstd (de)compressor: they are not thread-safe.
+    """
+
+    def __init__(self, url: str, ttl_seconds: int, max_bytes: int, enabled: bool = True):
+        self.url = url
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._engine: Optional[Engine] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, content: str = "") -> str:
+        content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        return hashlib.sha256(f"{model}\0{prompt}\0{content_hash}".encode('utf-8')).hexdigest()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def _codec(self):
+        """The calling thread's compressor and decompressor."""
+        codec = getattr(self._local, "codec", None)
+        if codec is None:
+            codec = self._local.codec = (zstandard.ZstdCompressor(level=10), zstandard.ZstdDecompressor())
+        return codec
+
+    def _get_engine(self) -> Engine:
+        with self._lock:
+            if self._engine is None:
+                database = make_url(self.url).database
+                if self.url.startswith("sqlite") and database and os.path.dirname(database):
+                    os.makedirs(os.path.dirname(database), exist_ok=True)
+                self._engine = create_engine(self.url)
+                metadata.create_all(self._engine)
+            return self._engine
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._get_engine().begin() as conn:
+            row = conn.execute(select(responses.c.value, responses.c.created_at).where(responses.c.key == key)).first()
+            if row is None:
+                return None
+            if now - row.created_at > self.ttl_seconds:
+                conn.execute(delete(responses).where(responses.c.key == key))
+                return None
+            conn.execute(update(responses).where(responses.c.key == key).values(accessed_at=now))
+        return self._codec()[1].decompress(row.value).decode('utf-8')
+
+    def _set(self, key: str, model: str, value: str) -> None:
+        now = time.time()
+        blob = self._codec()[0].compress(value.encode('utf-8'))
+        with self._get_engine().begin() as conn:
+            conn.execute(delete(responses).where(
+                (responses.c.key == key) | (responses.c.created_at < now - self.ttl_seconds)
+            ))
+            conn.execute(responses.insert().values(
+                key=key, model=model, value=blob, size=len(blob), created_at=now, accessed_at=now
+            ))
+            total = conn.execute(select(func.coalesce(func.sum(responses.c.size), 0))).scalar_one()
+            if total <= self.max_bytes:
+                return
+            # Evict least recently used entries until the store fits again. Candidates are
+            # fetched before deleting, so no cursor is open while the table changes.
+            rows = conn.execute(select(responses.c.key, responses.c.size).order_by(responses.c.accessed_at)).all()
+            evicted = []
+            for row in rows:
+                if total <= self.max_bytes:
+                    break
+                evicted.append(row.key)
+                total -= row.size
+            conn.execute(delete(responses).where(responses.c.key.in_(evicted)))
+
+    async def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        try:
+            value = await asyncio.to_thread(self._get, key)
+        except Exception as e:
+            logger.warning(f"Response cache lookup failed: {str(e)}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        logger.info(f"Response cache {'hit' if value is not None else 'miss'} for {key[:12]} "
+                    f"(hit rate {self.hit_rate:.0%}, {self.hits}/{self.hits + self.misses})")
+        return value
+
+    async def set(self, key: str, model: str, value: str) -> None:
+        if not self.enabled or not value:
+            return
+        try:
+            await asyncio.to_thread(self._set, key, model, value)
+        except Exception as e:
+            logger.warning(f"Response cache store failed: {str(e)}")
+
+response_cache = ResponseCache(
+    url=settings.LLM_CACHE_URL,
+    ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+    max_bytes=settings.LLM_CACHE_MAX_BYTES,
+    enabled=settings.LLM_CACHE_ENABLED
+)
@@ -0,0 +1,90 @@
+from typing import Optional
+import logging
+import re
+import httpx
+import openai
+from tenacity import RetryCallState, retry, retry_if_exception, stop_after_attempt
+from tenacity.wait import wait_base, wait_exponential
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Error classes: worth retrying as is, never worth retrying, or retryable with less input
+TRANSIENT = "transient"
+FATAL = "fatal"
+TOO_LONG = "too_long"
+
+CONTEXT_LENGTH_RE = re.compile(
+    r"maximum context length is (\d+) tokens.*?requested (\d+) tokens", re.I | re.S
+)
+MAX_RETRY_AFTER_SECONDS = 120
+
+def classify_error(exc: BaseException) -> str:
+    """Classify an exception raised by a DeepSeek request."""
+    if isinstance(exc, openai.BadRequestError):
+        message = str(exc).lower()
+        if "context length" in message or "too long" in message or "reduce the length" in message:
+            return TOO_LONG
+        return FATAL
+    if isinstance(exc, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError,
+                        openai.ConflictError, httpx.TransportError)):
+        return TRANSIENT
+    if isinstance(exc, openai.APIStatusError):
+        # DeepSeek answers 503 when overloaded; 4xx (auth, balance, not found) will fail again
+        return TRANSIENT if exc.status_code in (408, 409, 429) or exc.status_code >= 500 else FATAL
+    return FATAL
+
+def is_transient(exc: BaseException) -> bool:
+    return classify_error(exc) == TRANSIENT
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Delay requested by the provider through ``Retry-After``/``retry-after-ms`` headers."""
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+def context_overflow_ratio(exc: BaseException) -> Optional[float]:
+    """Provider's maximum context divided by the tokens requested, from a context-length error."""
+    match = CONTEXT_LENGTH_RE.search(str(exc))
+    if not match:
+        return None
+    maximum, requested = int(match.group(1)), int(match.group(2))
+    return maximum / requested if requested else None
+
+class wait_retry_after(wait_base):
+    """Wait as long as the provider's ``Retry-After`` asks, falling back to exponential backoff."""
+
+    def __init__(self, fallback: wait_base = wait_exponential(multiplier=1, min=4, max=10)):
+        self.fallback = fallback
+
+    def __call__(self, retry_state: RetryCallState) -> float:
+        exc = retry_state.outcome.exception() if retry_state.outcome else None
+        delay = retry_after_seconds(exc) if exc is not None else None
+        if delay is None:
+            return self.fallback(retry_state)
+        logger.info(f"Provider asked to retry after {delay:.1f}s")
+        return min(max(delay, 0.0), MAX_RETRY_AFTER_SECONDS)
+
+def log_retry(retry_state: RetryCallState):
+    exc = retry_state.outcome.exception()
+    logger.warning(f"Transient error on attempt {retry_state.attempt_number} of "
+                   f"{retry_state.fn.__name__ if retry_state.fn else 'request'}: {str(exc)}")
+
+# Retry policy for DeepSeek requests: only transient errors, honouring Retry-After.
+# The original exception is re-raised so callers can classify it.
+llm_retry = retry(
+    retry=retry_if_exception(is_transient),
+    stop=stop_after_attempt(3),
+    wait=wait_retry_after(),
+    before_sleep=log_retry,
+    reraise=True
+)
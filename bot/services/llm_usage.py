@@ -0,0 +1,72 @@
+from dataclasses import dataclass
+from typing import Any, Mapping, Optional
+import logging
+import threading
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+@dataclass
+class RequestUsage:
+    """Token usage of one model request, split by DeepSeek's context cache."""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cache_hit_tokens: int = 0
+    cache_miss_tokens: int = 0
+
+    @property
+    def cache_hit_ratio(self) -> float:
+        return self.cache_hit_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+def usage_from_dict(usage: Optional[Mapping[str, Any]]) -> Optional[RequestUsage]:
+    """Read a raw ``usage`` object from the chat completions API.
+
+    DeepSeek reports ``prompt_cache_hit_tokens`` and ``prompt_cache_miss_tokens``;
+    ``prompt_tokens_details.cached_tokens`` is the OpenAI-compatible fallback.
+    """
+    if not usage:
+        return None
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    hit = usage.get("prompt_cache_hit_tokens")
+    if hit is None:
+        hit = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    miss = usage.get("prompt_cache_miss_tokens")
+    if miss is None:
+        miss = prompt_tokens - hit
+    return RequestUsage(prompt_tokens, usage.get("completion_tokens") or 0, hit, miss)
+
+def usage_from_message(message) -> Optional[RequestUsage]:
+    """Read usage from a LangChain message or stream chunk, preferring the raw provider usage."""
+    raw = (getattr(message, "response_metadata", None) or {}).get("token_usage")
+    if raw:
+        return usage_from_dict(raw)
+    metadata = getattr(message, "usage_metadata", None)
+    if not metadata:
+        return None
+    hit = (metadata.get("input_token_details") or {}).get("cache_read") or 0
+    return RequestUsage(metadata["input_tokens"], metadata["output_tokens"], hit, metadata["input_tokens"] - hit)
+
+class UsageStats:
+    """Process-wide usage totals; every recorded request is also logged on its own."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.totals = RequestUsage()
+
+    def record(self, label: str, model: str, usage: Optional[RequestUsage]):
+        if usage is None:
+            logger.info(f"Usage for {label} ({model}): not reported")
+            return
+        with self._lock:
+            self.requests += 1
+            self.totals.prompt_tokens += usage.prompt_tokens
+            self.totals.completion_tokens += usage.completion_tokens
+            self.totals.cache_hit_tokens += usage.cache_hit_tokens
+            self.totals.cache_miss_tokens += usage.cache_miss_tokens
+        logger.info(f"Usage for {label} ({model}): prompt {usage.prompt_tokens} tokens "
+                    f"(cache hit {usage.cache_hit_tokens}, miss {usage.cache_miss_tokens}, "
+                    f"{usage.cache_hit_ratio:.0%}), completion {usage.completion_tokens} tokens; "
+                    f"process cache hit ratio {self.totals.cache_hit_ratio:.0%}")
+
+usage_stats = UsageStats()
@@ -0,0 +1,63 @@
+from dataclasses import dataclass
+from typing import List
+import logging
+import math
+import re
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MODULE_HEADING_RE = re.compile(r'^## (?:Module|Модуль) (\d+)', re.M)
+
+@dataclass
+class ModuleJob:
+    """A contiguous run of prompt modules generated by one model call."""
+    first: int
+    last: int
+    min_words: int
+    max_words: int
+
+    @property
+    def module_range(self) -> str:
+        return f"{self.first}-{self.last}" if self.last > self.first else str(self.first)
+
+    def scope_instructions(self, total_modules: int) -> str:
+        """Tell the model to write only this job's modules, so the parts can be stitched in order."""
+        note = f"Write only modules {self.module_range} of the {total_modules} modules above and nothing else."
+        if self.first > 1:
+            note += f" Start directly with the heading of module {self.first}, without the workbook title or introduction."
+        if self.last < total_modules:
+            note += f" Stop after module {self.last}; the remaining modules are written separately."
+        return note
+
+def count_modules(instructions: str) -> int:
+    """Number of ``## Module N`` (or ``## Модуль N``) sections a prompt asks for."""
+    return max((int(n) for n in MODULE_HEADING_RE.findall(instructions)), default=0)
+
+def plan_module_jobs(total_modules: int, min_words_total: int, max_words_total: int,
+                     max_words_per_job: int, max_jobs: int) -> List[ModuleJob]:
+    """Split ``total_modules`` modules into parallel jobs of consecutive modules.
+
+    The number of jobs is the fewest that keeps each call within ``max_words_per_job``,
+    capped by ``max_jobs`` and the number of modules. Modules are shared out as evenly
+    as possible, earlier jobs taking the remainder, and each job's word target is its
+    share of the totals.
+    """
+    if total_modules < 1:
+        return []
+    jobs_count = max(1, min(total_modules, max_jobs, math.ceil(max_words_total / max(max_words_per_job, 1))))
+    base, extra = divmod(total_modules, jobs_count)
+    jobs = []
+    first = 1
+    for i in range(jobs_count):
+        size = base + (1 if i < extra else 0)
+        jobs.append(ModuleJob(
+            first=first,
+            last=first + size - 1,
+            min_words=min_words_total * size // total_modules,
+            max_words=max_words_total * size // total_modules
+        ))
+        first += size
+    logger.info(f"Planned {jobs_count} jobs for {total_modules} modules: "
+                f"{', '.join(job.module_range for job in jobs)}")
+    return jobs
@@ -1,45 +1,33 @@
-import os
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, KeepTogether
 from reportlab.lib.units import inch
 from reportlab.lib import colors
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from markdown import util
 import markdown
-from bs4 import BeautifulSoup
-from pathlib import Path
+from bot.services.executor import run_cpu_bound
+from bot.services.fonts import register_fonts
+from functools import lru_cache
+from html import unescape
+from io import BytesIO
+from typing import BinaryIO, List, Tuple, Union
+from xml.etree.ElementTree import Element
+import asyncio
 import logging
+import math
+import re
+import threading
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Define font paths relative to the script's location
-
-FONT_DIR = Path("bot/fonts")
-DEJAVU_SANS_PATH = os.path.join(FONT_DIR, 'DejaVuSans.ttf')
-DEJAVU_SANS_BOLD_PATH = os.path.join(FONT_DIR, 'DejaVuSans-Bold.ttf')
-
-# Register fonts with proper Cyrillic support
-try:
-    if os.path.exists(DEJAVU_SANS_PATH):
-        pdfmetrics.registerFont(TTFont('DejaVuSans', DEJAVU_SANS_PATH))
-        logger.info(f"Font DejaVuSans registered from {DEJAVU_SANS_PATH}")
-    else:
-        raise FileNotFoundError(f"Font file {DEJAVU_SANS_PATH} not found")
-
-    if os.path.exists(DEJAVU_SANS_BOLD_PATH):
-        pdfmetrics.registerFont(TTFont('DejaVuSans-Bold', DEJAVU_SANS_BOLD_PATH))
-        logger.info(f"Font DejaVuSans-Bold registered from {DEJAVU_SANS_BOLD_PATH}")
-    else:
-        logger.warning(f"Bold font file {DEJAVU_SANS_BOLD_PATH} not found, using DejaVuSans")
-        pdfmetrics.registerFont(TTFont('DejaVuSans-Bold', DEJAVU_SANS_PATH))
-    font_name = 'DejaVuSans'
-    bold_font_name = 'DejaVuSans-Bold'
-except Exception as e:
-    logger.error(f"Error registering fonts: {str(e)}, falling back to Helvetica (no Cyrillic support)")
-    font_name = 'Helvetica'
-    bold_font_name = 'Helvetica-Bold'
+# Fonts are registered once per process (and per process-pool worker)
+fonts = register_fonts()
+font_name = fonts.regular
+bold_font_name = fonts.bold
 
 # Set up styles
 styles = getSampleStyleSheet()
@@ -66,122 +54,439 @@ for style_name in ['Title', 'Heading1', 'Heading2', 'BodyText', 'Bullet', 'Table
             styles.add(ParagraphStyle(name='TableText', fontName=font_name, fontSize=10, leading=12, textColor=colors.black))
             logger.info(f"Created new style TableText with fontName={font_name}")
 
-def markdown_to_html(text):
-    """Convert markdown text to HTML."""
-    logger.info("Converting markdown to HTML")
-    html = markdown.markdown(text, extensions=['tables', 'fenced_code'])
-    return html.replace('\n', '<br/>')  # Ensure line breaks are preserved
+styles.add(ParagraphStyle(name='TableHeader', parent=styles['TableText'], fontName=bold_font_name))
+
+TABLE_WIDTH = 7 * inch  # Letter page width less the margins
+TABLE_FONT_SIZE = 10
+TABLE_CELL_PADDING = 6
+# Tables up to a third of the page are kept on one page; longer ones split, repeating the header
+TABLE_KEEP_TOGETHER_HEIGHT = (letter[1] - 1.5 * inch) / 3
+
+# Built once and shared by every table. Font commands apply to the plain-string cells.
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#E6F0FA')),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+    ('FONTNAME', (0, 0), (-1, 0), bold_font_name),
+    ('FONTNAME', (0, 1), (-1, -1), font_name),
+    ('FONTSIZE', (0, 0), (-1, -1), TABLE_FONT_SIZE),
+    ('LEADING', (0, 0), (-1, -1), styles['TableText'].leading),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ('LEFTPADDING', (0, 0), (-1, -1), TABLE_CELL_PADDING),
+    ('RIGHTPADDING', (0, 0), (-1, -1), TABLE_CELL_PADDING),
+    ('TOPPADDING', (0, 0), (-1, -1), TABLE_CELL_PADDING),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), TABLE_CELL_PADDING),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F8F8F8')]),
+])
+
+# Python-Markdown keeps per-document state, so each thread reuses its own parser
+_markdown_local = threading.local()
+
+# Children that are laid out as separate flowables rather than inline markup
+BLOCK_TAGS = frozenset({'p', 'ul', 'ol', 'li', 'table', 'pre', 'blockquote', 'hr', 'div',
+                        'h1', 'h2', 'h3', 'h4', 'h5', 'h6'})
+# Inline tags ReportLab paragraphs understand; other inline tags are reduced to their text
+INLINE_TAGS = {'strong': 'b', 'b': 'b', 'em': 'i', 'i': 'i', 'u': 'u', 'del': 'strike', 'sub': 'sub', 'sup': 'sup'}
+# Text escaping as in Python-Markdown's serializer: entities already present are kept
+AMP_RE = re.compile(r'&(?!#?\w+;)')
+MARKUP_TAG_RE = re.compile(r'<[^>]+>')
+# One raw HTML tag, as Python-Markdown stashes inline HTML
+HTML_TAG_RE = re.compile(r'<(/?)([a-zA-Z][a-zA-Z0-9]*)\b[^>]*>')
+# Bullet glyphs by nesting depth (both are in DejaVu Sans and Helvetica)
+BULLETS = ("•", "–")
+
+def _markdown_parser() -> markdown.Markdown:
+    md = getattr(_markdown_local, "md", None)
+    if md is None:
+        md = markdown.Markdown(extensions=['tables', 'fenced_code'])
+        # Indentation of the serialized HTML only; the tree is walked directly
+        md.treeprocessors.deregister('prettify')
+        _markdown_local.md = md
+    return md
+
+def parse_markdown(text: str) -> Tuple[Element, List[str]]:
+    """Run Python-Markdown up to its element tree, skipping HTML serialization.
+
+    Returns the root element and the stash of raw HTML that placeholders in the
+    tree's text refer to.
+    """
+    md = _markdown_parser()
+    md.reset()
+    lines = text.split("\n")
+    for preprocessor in md.preprocessors:
+        lines = preprocessor.run(lines)
+    root = md.parser.parseDocument(lines).getroot()
+    for treeprocessor in md.treeprocessors:
+        new_root = treeprocessor.run(root)
+        if new_root is not None:
+            root = new_root
+    return root, [str(block) for block in md.htmlStash.rawHtmlBlocks]
+
+def _escape(text: str) -> str:
+    return AMP_RE.sub('&amp;', text).replace('<', '&lt;').replace('>', '&gt;')
+
+def _is_stashed_block(element: Element) -> bool:
+    """A paragraph standing in for a raw HTML or fenced code block."""
+    return len(element) == 0 and bool(element.text) and \
+        util.HTML_PLACEHOLDER_RE.fullmatch(element.text.strip()) is not None
+
+def _inline_element(element: Element, parts: List[str]) -> None:
+    tag = element.tag
+    if tag == 'br':
+        parts.append('<br/>')
+    elif tag == 'img':
+        parts.append(_escape(element.get('alt', '')))
+    else:
+        mapped = INLINE_TAGS.get(tag)
+        href = element.get('href') if tag == 'a' else None
+        if href:
+            href = _escape(href).replace('"', '&quot;')
+            parts.append(f'<a href="{href}">')
+        elif mapped:
+            parts.append(f'<{mapped}>')
+        if element.text:
+            parts.append(_escape(element.text))
+        for child in element:
+            _inline_element(child, parts)
+            if child.tail:
+                parts.append(_escape(child.tail))
+        if href:
+            parts.append('</a>')
+        elif mapped:
+            parts.append(f'</{mapped}>')
+
+def _inline_html(raw: str) -> str:
+    """ReportLab markup for stashed inline HTML.
+
+    ``<br>`` and the tags in INLINE_TAGS are normalized (ReportLab rejects ``<br>``
+    without a slash); other tags are escaped and shown as text, entities decoded.
+    """
+    match = HTML_TAG_RE.fullmatch(raw.strip())
+    if match is None:
+        return _escape(unescape(raw))
+    closing, tag = match.group(1), match.group(2).lower()
+    if tag == 'br':
+        return '<br/>'
+    if tag in INLINE_TAGS:
+        return f'<{closing}{INLINE_TAGS[tag]}>'
+    return _escape(raw)
 
-def html_to_flowables(html_content):
-    """Convert HTML to ReportLab flowables."""
-    logger.info("Parsing HTML to flowables")
-    soup = BeautifulSoup(html_content, 'html.parser')
+def _paragraph(markup: str, style: ParagraphStyle) -> Paragraph:
+    """A Paragraph, falling back to plain text if ReportLab rejects the markup (e.g. unclosed tags)."""
+    try:
+        return Paragraph(markup, style)
+    except ValueError as e:
+        logger.warning(f"Invalid paragraph markup, rendering it as plain text: {str(e)}")
+        plain = unescape(MARKUP_TAG_RE.sub(lambda m: '\n' if m.group(0).startswith('<br') else '', markup))
+        return Paragraph(_escape(plain).replace('\n', '<br/>'), style)
+
+def _inline_markup(element: Element, stash: List[str]) -> str:
+    """ReportLab paragraph markup for the text and inline children of ``element``."""
+    parts = [_escape(element.text)] if element.text else []
+    for child in element:
+        if child.tag not in BLOCK_TAGS:
+            _inline_element(child, parts)
+        if child.tail:
+            parts.append(_escape(child.tail))
+    markup = "".join(parts).strip()
+    if '\x02' in markup:
+        markup = util.HTML_PLACEHOLDER_RE.sub(lambda m: _inline_html(stash[int(m.group(1))]), markup)
+        markup = markup.replace(util.AMP_SUBSTITUTE, '&')
+    return markup.replace('\n', '<br/>')  # Keep the line breaks of the source
+
+@lru_cache(maxsize=None)
+def _bullet_style(depth: int) -> ParagraphStyle:
+    if depth == 0:
+        return styles['Bullet']
+    base = styles['Bullet']
+    return ParagraphStyle(f'Bullet{depth}', parent=base, leftIndent=base.leftIndent + 18 * depth,
+                          bulletIndent=base.bulletIndent + 18 * depth)
+
+def _list_flowables(element: Element, stash: List[str], depth: int = 0) -> list:
+    """Flowables for a ``ul``/``ol``, nested lists indented under their item."""
     flowables = []
+    style = _bullet_style(depth)
+    ordered = element.tag == 'ol'
+    try:
+        number = int(element.get('start', 1))
+    except ValueError:
+        number = 1
+
+    for li in element.findall('li'):
+        marker = f"{number}." if ordered else BULLETS[min(depth, len(BULLETS) - 1)]
+        chunks = [_inline_markup(li, stash)]
+
+        def flush():
+            nonlocal marker
+            text = '<br/>'.join(chunk for chunk in chunks if chunk)
+            chunks.clear()
+            if text:
+                # Only the item's first paragraph carries the marker
+                flowables.append(_paragraph(f"{marker} {text}" if marker else text, style))
+                flowables.append(Spacer(1, 0.05 * inch))
+                marker = None
+
+        for child in li:
+            if child.tag in ('ul', 'ol'):
+                flush()
+                flowables.extend(_list_flowables(child, stash, depth + 1))
+            elif child.tag == 'p' and not _is_stashed_block(child):
+                chunks.append(_inline_markup(child, stash))
+        flush()
+        number += 1
+    return flowables
+
+def solve_column_widths(natural: List[float], minimum: List[float], total: float) -> List[float]:
+    """Share ``total`` between columns by their content, like an automatic HTML table layout.
+
+    ``natural`` is each column's width with its cells on one line and ``minimum`` the
+    width of its longest word. If every column fits on one line the spare width is
+    spread in proportion to content. Otherwise each column gets its minimum and the
+    rest is shared in proportion to how much wider each column would like to be.
+    """
+    if sum(natural) <= total:
+        if not sum(natural):
+            return [total / len(natural)] * len(natural)
+        return [width * total / sum(natural) for width in natural]
+    if sum(minimum) >= total:
+        return [width * total / sum(minimum) for width in minimum]
+    spare = total - sum(minimum)
+    wanted = [max(n - m, 0.0) for n, m in zip(natural, minimum)]
+    return [m + spare * w / sum(wanted) for m, w in zip(minimum, wanted)]
+
+def _table_flowables(rows: List[list]) -> list:
+    """A table from rows of cell markup, the first row being the header.
+
+    Each cell's text is measured once; the measurements give the column widths and
+    the estimated height. Cells without markup become plain strings, broken into
+    lines here when too wide, so only cells with markup pay for Paragraph layout,
+    which the table repeats when it splits and again when it draws.
+    """
+    col_count = len(rows[0])
+    padding = 2 * TABLE_CELL_PADDING
+    texts, widths = [], []
+    natural, minimum = [padding] * col_count, [padding] * col_count
+    for row_index, row in enumerate(rows):
+        font = bold_font_name if row_index == 0 else font_name
+        row_texts, row_widths = [], []
+        for col, markup in enumerate(row[:col_count]):
+            text = unescape(MARKUP_TAG_RE.sub('', markup)) if '<' in markup or '&' in markup else markup
+            width = stringWidth(text, font, TABLE_FONT_SIZE)
+            longest = max(text.split(), key=len, default='')
+            natural[col] = max(natural[col], width + padding)
+            minimum[col] = max(minimum[col], stringWidth(longest, font, TABLE_FONT_SIZE) + padding)
+            row_texts.append(text)
+            row_widths.append(width)
+        texts.append(row_texts)
+        widths.append(row_widths)
+    col_widths = solve_column_widths(natural, minimum, TABLE_WIDTH)
+
+    data = []
+    height = 0.0
+    leading = styles['TableText'].leading
+    for row_index, row in enumerate(rows):
+        font = bold_font_name if row_index == 0 else font_name
+        style = styles['TableHeader'] if row_index == 0 else styles['TableText']
+        cells, lines = [], 1
+        for col, markup in enumerate(row[:col_count]):
+            room = col_widths[col] - padding
+            text = texts[row_index][col]
+            if '<' in markup:
+                cells.append(_paragraph(markup, style))
+                lines = max(lines, math.ceil(widths[row_index][col] / max(room, 1.0)))
+            elif widths[row_index][col] <= room:
+                cells.append(text)
+            else:
+                cell_lines = simpleSplit(text, font, TABLE_FONT_SIZE, room)
+                cells.append("\n".join(cell_lines))
+                lines = max(lines, len(cell_lines))
+        data.append(cells)
+        height += lines * leading + padding
+
+    table = Table(data, colWidths=col_widths, repeatRows=1, style=TABLE_STYLE)
+    return [KeepTogether(table) if height <= TABLE_KEEP_TOGETHER_HEIGHT else table, Spacer(1, 0.2 * inch)]
+
+def markdown_to_flowables(text: str) -> list:
+    """Convert markdown straight to ReportLab flowables.
 
-    for element in soup:
-        if element.name == 'h1':
-            flowables.append(KeepTogether(Paragraph(element.text.strip(), styles['Title'])))
+    Walks the element tree Python-Markdown builds instead of rendering HTML and
+    parsing it back. Raw HTML and fenced code blocks are skipped.
+    """
+    root, stash = parse_markdown(text)
+    flowables = []
+
+    for element in root:
+        if element.tag == 'h1':
+            flowables.append(KeepTogether(_paragraph(_inline_markup(element, stash), styles['Title'])))
             flowables.append(Spacer(1, 0.3 * inch))
-        elif element.name == 'h2':
-            flowables.append(KeepTogether(Paragraph(element.text.strip(), styles['Heading1'])))
+        elif element.tag == 'h2':
+            flowables.append(KeepTogether(_paragraph(_inline_markup(element, stash), styles['Heading1'])))
             flowables.append(Spacer(1, 0.2 * inch))
-        elif element.name == 'h3':
-            flowables.append(Paragraph(element.text.strip(), styles['Heading2']))
+        elif element.tag == 'h3':
+            flowables.append(_paragraph(_inline_markup(element, stash), styles['Heading2']))
             flowables.append(Spacer(1, 0.15 * inch))
-        elif element.name == 'p':
-            text = element.decode_contents().strip()  # Preserve <br/> for line breaks
-            if text:
-                flowables.append(Paragraph(text, styles['BodyText']))
+        elif element.tag == 'p':
+            text = _inline_markup(element, stash)
+            if text and not _is_stashed_block(element):
+                flowables.append(_paragraph(text, styles['BodyText']))
                 flowables.append(Spacer(1, 0.1 * inch))
-        elif element.name == 'ul':
-            for li in element.find_all('li'):
-                text = li.decode_contents().strip()
-                if text:
-                    flowables.append(Paragraph(f"• {text}", styles['Bullet']))
-                    flowables.append(Spacer(1, 0.05 * inch))
-        elif element.name == 'ol':
-            for i, li in enumerate(element.find_all('li'), 1):
-                text = li.decode_contents().strip()
-                if text:
-                    flowables.append(Paragraph(f"{i}. {text}", styles['Bullet']))
-                    flowables.append(Spacer(1, 0.05 * inch))
-        elif element.name == 'table':
-            data = []
-            for tr in element.find_all('tr'):
-                row = [Paragraph(td.decode_contents().strip(), styles['TableText']) for td in tr.find_all(['td', 'th'])]
-                data.append(row)
-            if data:
-                total_width = 7 * inch  # Adjusted for letter page with margins
-                col_count = len(data[0])
-                col_width = total_width / max(col_count, 1)
-                table = Table(data, colWidths=[col_width] * col_count)
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#E6F0FA')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-                    ('FONTNAME', (0, 0), (-1, 0), bold_font_name),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-                    ('FONTNAME', (0, 1), (-1, -1), font_name),
-                    ('FONTSIZE', (0, 1), (-1, -1), 10),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                    ('BOX', (0, 0), (-1, -1), 0.5, colors.grey),
-                    ('LEFTPADDING', (0, 0), (-1, -1), 6),
-                    ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-                    ('TOPPADDING', (0, 0), (-1, -1), 6),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F8F8F8')]),
-                ]))
-                flowables.append(KeepTogether(table))
-                flowables.append(Spacer(1, 0.2 * inch))
-        elif element.name == 'hr':
+        elif element.tag in ('ul', 'ol'):
+            flowables.extend(_list_flowables(element, stash))
+        elif element.tag == 'table':
+            rows = [[_inline_markup(cell, stash) for cell in tr] for tr in element.iter('tr')]
+            if rows:
+                flowables.extend(_table_flowables(rows))
+        elif element.tag == 'hr':
             flowables.append(Spacer(1, 0.3 * inch))
 
     return flowables
 
-def generate_pdf(content: str, output_path: str) -> str:
-    """Generate a formatted PDF using ReportLab with two-pass page numbering."""
-    logger.info(f"Starting PDF generation for {output_path}")
-    doc = SimpleDocTemplate(output_path, pagesize=letter, rightMargin=0.75 * inch, leftMargin=0.75 * inch,
-                            topMargin=0.75 * inch, bottomMargin=0.75 * inch)
+# A file path, or a binary buffer such as BytesIO to render in memory
+PdfOutput = Union[str, BinaryIO]
+
+def output_label(output: PdfOutput) -> str:
+    """Name of a PDF output for log messages."""
+    return output if isinstance(output, str) else "in-memory buffer"
+
+def _new_document(output_path: PdfOutput) -> SimpleDocTemplate:
+    return SimpleDocTemplate(output_path, pagesize=letter, rightMargin=0.75 * inch, leftMargin=0.75 * inch,
+                             topMargin=0.75 * inch, bottomMargin=0.75 * inch)
+
+class NumberedCanvas(Canvas):
+    """Canvas that draws "page X of Y" footers once the page count is known.
+
+    Finished pages are buffered instead of written out, and the footers are drawn on
+    each of them at save time, so the document is laid out in a single pass.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._page_states = []
+
+    def showPage(self):
+        self._page_states.append(dict(self.__dict__))
+        self._startPage()
+
+    def save(self):
+        page_count = len(self._page_states)
+        for state in self._page_states:
+            self.__dict__.update(state)
+            self._draw_footer(page_count)
+            super().showPage()
+        super().save()
+
+    def _draw_footer(self, page_count: int):
+        self.saveState()
+        self.setFont(font_name, 9)
+        self.setFillColor(colors.grey)
+        self.drawCentredString(self._pagesize[0] / 2, 0.5 * inch,
+                               f"Страница {self.getPageNumber()} из {page_count}")
+        self.restoreState()
+
+def _build_with_page_numbers(output_path: PdfOutput, flowables: list) -> None:
+    """Lay out the story once; :class:`NumberedCanvas` adds "page X of Y" footers on save."""
+    _new_document(output_path).build(flowables, canvasmaker=NumberedCanvas)
+
+def generate_pdf(content: str, output_path: PdfOutput) -> PdfOutput:
+    """Generate a formatted PDF using ReportLab with "page X of Y" footers.
+
+    ``output_path`` may also be a binary buffer, which is left open for the caller.
+    """
+    logger.info(f"Starting PDF generation for {output_label(output_path)}")
+    try:
+        _build_with_page_numbers(output_path, markdown_to_flowables(content))
+        logger.info(f"PDF generated at {output_label(output_path)}")
+        return output_path
+    except Exception as e:
+        logger.error(f"Error in PDF generation: {str(e)}")
+        raise
+
+def render_pdf_bytes(content: str) -> bytes:
+    """Like :func:`generate_pdf`, but return the PDF as bytes; suited to the process pool."""
+    buffer = BytesIO()
+    generate_pdf(content, buffer)
+    return buffer.getvalue()
+
+# Lines that start a top-level section ("# Title" or "## Module N") in generated markdown
+SECTION_HEADING_RE = re.compile(r'^#{1,2} ', re.M)
 
+def _section_flowables(section: str) -> list:
+    """Flowables for one section; if conversion fails, its lines are kept as plain paragraphs."""
     try:
-        pdfmetrics.registerFont(TTFont(font_name, DEJAVU_SANS_PATH))
-        if bold_font_name != font_name:
-            pdfmetrics.registerFont(TTFont(bold_font_name, DEJAVU_SANS_BOLD_PATH if os.path.exists(DEJAVU_SANS_BOLD_PATH) else DEJAVU_SANS_PATH))
-        
-        html_content = markdown_to_html(content)
-        flowables = html_to_flowables(html_content)
-
-        # First pass to count pages
-        logger.info("Running first pass to count pages")
-        page_count = [0]
-        def count_pages(canvas, doc):
-            page_count[0] += 1
-        doc.build(flowables, onFirstPage=count_pages, onLaterPages=count_pages)
-
-        # Second pass to generate PDF with page numbers
-        logger.info(f"Running second pass with {page_count[0]} pages")
-        doc = SimpleDocTemplate(output_path, pagesize=letter, rightMargin=0.75 * inch, leftMargin=0.75 * inch,
-                                topMargin=0.75 * inch, bottomMargin=0.75 * inch)
-        pdfmetrics.registerFont(TTFont(font_name, DEJAVU_SANS_PATH))
-        if bold_font_name != font_name:
-            pdfmetrics.registerFont(TTFont(bold_font_name, DEJAVU_SANS_BOLD_PATH if os.path.exists(DEJAVU_SANS_BOLD_PATH) else DEJAVU_SANS_PATH))
-        flowables = html_to_flowables(html_content)
-
-        def add_page_number(canvas, doc):
-            page_num = canvas.getPageNumber()
-            canvas.saveState()
-            canvas.setFont(font_name, 9)
-            canvas.setFillColor(colors.grey)
-            canvas.drawCentredString(doc.pagesize[0] / 2, 0.5 * inch, f"Страница {page_num} из {page_count[0]}")
-            canvas.restoreState()
-
-        doc.build(flowables, onFirstPage=add_page_number, onLaterPages=add_page_number)
-        logger.info(f"PDF generated at {output_path}")
+        return markdown_to_flowables(section)
+    except Exception as e:
+        logger.error(f"Error converting section to flowables, keeping it as plain text: {str(e)}")
+        return [Paragraph(_escape(line), styles['BodyText']) for line in section.splitlines() if line.strip()]
+
+class IncrementalPdfBuilder:
+    """Turns streamed markdown into flowables one completed section at a time.
+
+    A section is complete once the next top-level heading starts. It is then converted
+    in the process pool while the model is still writing, so neither the event loop nor
+    the stream waits for it, and a conversion error cannot abort the model call.
+    :meth:`feed` must be called from the event loop. ``reset`` discards everything,
+    e.g. before a retried generation.
+    """
+
+    def __init__(self):
+        self._sections: List[asyncio.Future] = []
+        self._pending = ""
+
+    def reset(self) -> None:
+        self._sections = []
+        self._pending = ""
+
+    def feed(self, text: str) -> None:
+        self._pending += text
+        boundary = None
+        for match in SECTION_HEADING_RE.finditer(self._pending):
+            if match.start() > 0:
+                boundary = match.start()
+        if boundary is not None:
+            self._convert(self._pending[:boundary])
+            self._pending = self._pending[boundary:]
+
+    async def finish(self) -> list:
+        """Convert the trailing section and return all flowables, in order."""
+        if self._pending:
+            self._convert(self._pending)
+            self._pending = ""
+        flowables = []
+        for section in await asyncio.gather(*self._sections):
+            flowables.extend(section)
+        return flowables
+
+    def _convert(self, section: str) -> None:
+        if section.strip():
+            self._sections.append(asyncio.ensure_future(run_cpu_bound(_section_flowables, section)))
+
+def section_break_flowables() -> list:
+    """Flowables for a ``---`` break between separately built parts."""
+    return markdown_to_flowables("---")
+
+def build_pdf(flowables: list, output_path: PdfOutput) -> PdfOutput:
+    """Paginate prepared flowables into a PDF with "page X of Y" footers."""
+    logger.info(f"Building PDF from {len(flowables)} flowables at {output_label(output_path)}")
+    try:
+        _build_with_page_numbers(output_path, flowables)
+        logger.info(f"PDF generated at {output_label(output_path)}")
         return output_path
     except Exception as e:
         logger.error(f"Error in PDF generation: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+def layout_pdf_bytes(flowables: list) -> bytes:
+    """Like :func:`build_pdf`, but return the PDF as bytes; flowables pickle, so this suits the process pool."""
+    buffer = BytesIO()
+    build_pdf(flowables, buffer)
+    return buffer.getvalue()
+
+def write_pdf(data: bytes, output_path: PdfOutput) -> PdfOutput:
+    """Write rendered PDF bytes to a path or a binary buffer."""
+    if isinstance(output_path, str):
+        with open(output_path, "wb") as f:
+            f.write(data)
+    else:
+        output_path.write(data)
+    return output_path
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from bot.config.settings import settings
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """Process-wide limit on in-flight model requests and tokens per minute.
+
+    Token budget is a bucket that refills continuously at ``tokens_per_minute``.
+    Waiters are served in arrival order, so a burst of users queues here instead
+    of reaching the provider and coming back as 429s.
+    """
+
+    def __init__(self, max_in_flight: int, tokens_per_minute: int):
+        self.max_in_flight = max_in_flight
+        self.tokens_per_minute = tokens_per_minute
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._bucket_lock = asyncio.Lock()
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+
+    async def _take_tokens(self, tokens: int) -> None:
+        tokens = min(tokens, self.tokens_per_minute)
+        async with self._bucket_lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.tokens_per_minute,
+                                   self._tokens + (now - self._updated) * self.tokens_per_minute / 60)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                delay = (tokens - self._tokens) * 60 / self.tokens_per_minute
+                logger.info(f"Token budget exhausted, waiting {delay:.1f}s for {tokens} tokens")
+                await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def acquire(self, tokens: int = 0) -> AsyncIterator[None]:
+        """Hold one request slot and reserve ``tokens`` from the per-minute budget."""
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            await self._take_tokens(tokens)
+            self.in_flight += 1
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+        finally:
+            self._semaphore.release()
+
+llm_limiter = RateLimiter(settings.LLM_MAX_IN_FLIGHT, settings.LLM_TOKENS_PER_MINUTE)
@@ -0,0 +1,71 @@
+import logging
+from functools import lru_cache
+from typing import List, Optional
+import tiktoken
+from bot.config.settings import settings
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Texts longer than this are estimated from evenly spaced samples instead of encoded in full
+SAMPLE_THRESHOLD_CHARS = 200_000
+SAMPLE_COUNT = 16
+SAMPLE_CHARS = 4_000
+# Used only when the tiktoken encoding cannot be loaded (e.g. offline without a cached BPE file)
+FALLBACK_CHARS_PER_TOKEN = 4
+
+@lru_cache(maxsize=None)
+def get_encoding() -> Optional[tiktoken.Encoding]:
+    """Return the shared tiktoken encoding, loading it once per process."""
+    try:
+        return tiktoken.get_encoding(settings.TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.warning(f"Failed to load tiktoken encoding {settings.TOKENIZER_ENCODING}: {str(e)}. "
+                       f"Falling back to {FALLBACK_CHARS_PER_TOKEN} chars per token.")
+        return None
+
+def encode(text: str) -> List[int]:
+    encoding = get_encoding()
+    if encoding is None:
+        raise RuntimeError("tiktoken encoding is not available")
+    return encoding.encode_ordinary(text)
+
+def count_tokens(text: str) -> int:
+    """Count tokens exactly."""
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // FALLBACK_CHARS_PER_TOKEN + 1
+    return len(encoding.encode_ordinary(text))
+
+def estimate_tokens(text: str) -> int:
+    """Count tokens, extrapolating from samples for very long texts.
+
+    The samples are spread over the whole text, so mixed-script books (e.g. Cyrillic
+    with English quotations) are measured at their average density.
+    """
+    if len(text) <= SAMPLE_THRESHOLD_CHARS or get_encoding() is None:
+        return count_tokens(text)
+    stride = (len(text) - SAMPLE_CHARS) // (SAMPLE_COUNT - 1)
+    sampled_tokens = sum(count_tokens(text[i * stride:i * stride + SAMPLE_CHARS]) for i in range(SAMPLE_COUNT))
+    return int(len(text) * sampled_tokens / (SAMPLE_COUNT * SAMPLE_CHARS)) + 1
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Return the longest prefix of ``text`` that fits in ``max_tokens`` tokens."""
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens * FALLBACK_CHARS_PER_TOKEN]
+    tokens = encoding.encode_ordinary(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+def split_by_tokens(text: str, max_tokens: int) -> List[str]:
+    """Split ``text`` into consecutive pieces of at most ``max_tokens`` tokens each."""
+    encoding = get_encoding()
+    if encoding is None:
+        step = max_tokens * FALLBACK_CHARS_PER_TOKEN
+        return [text[i:i + step] for i in range(0, len(text), step)]
+    tokens = encoding.encode_ordinary(text)
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
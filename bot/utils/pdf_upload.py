@@ -0,0 +1,40 @@
+import asyncio
+import logging
+import os
+import tempfile
+from io import BytesIO
+from typing import Union
+from aiogram.types import BufferedInputFile, FSInputFile, Message
+from bot.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+SPOOL_DIR = "temp"
+
+def _write_file(fd: int, data: bytes) -> None:
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+
+async def send_pdf(message: Message, pdf: Union[bytes, BytesIO], filename: str) -> None:
+    """Send a rendered PDF to the chat of ``message`` as a document named ``filename``.
+
+    PDFs up to ``PDF_SPOOL_THRESHOLD_BYTES`` are uploaded straight from memory. Larger
+    ones are written to a uniquely named file for the upload, so the buffer is freed
+    while it runs, and the file is removed afterwards.
+    """
+    data = pdf.getvalue() if isinstance(pdf, BytesIO) else pdf
+    if len(data) <= settings.PDF_SPOOL_THRESHOLD_BYTES:
+        await message.answer_document(BufferedInputFile(data, filename=filename))
+        return
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    stem = os.path.splitext(filename)[0]
+    fd, path = tempfile.mkstemp(prefix=f"{stem}_{message.chat.id}_", suffix=".pdf", dir=SPOOL_DIR)
+    try:
+        logger.info(f"Spooling {len(data)} byte PDF to {path}")
+        await asyncio.to_thread(_write_file, fd, data)
+        del data
+        if isinstance(pdf, BytesIO):
+            pdf.close()
+        await message.answer_document(FSInputFile(path, filename=filename))
+    finally:
+        os.remove(path)
@@ -0,0 +1,55 @@
+import logging
+import time
+from typing import Dict, Optional
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+
+logger = logging.getLogger(__name__)
+
+class ProgressReporter:
+    """Edits a status message with generation progress, at most once per ``min_interval`` seconds.
+
+    Pass :meth:`update` as the ``on_progress`` callback of the generation services.
+    Word counts are tracked per module range, so parts generated in parallel add up.
+    Failed edits are logged and skipped, never raised into the generation; after
+    flood control, edits pause for as long as Telegram asks.
+    """
+
+    def __init__(self, status_msg: Message, label: str, target_words: int, language: str = "en",
+                 min_interval: float = 3.0):
+        self.status_msg = status_msg
+        self.label = label
+        self.target_words = target_words
+        self.language = language
+        self.min_interval = min_interval
+        self._words: Dict[str, int] = {}
+        self._last_edit = 0.0
+        self._paused_until = 0.0
+        self._last_text: Optional[str] = None
+
+    def _render(self, module_range: str) -> str:
+        percent = min(99, 100 * sum(self._words.values()) // max(self.target_words, 1))
+        if module_range == "all":
+            return f"{self.label}: {percent}%..."
+        modules = "модули" if self.language == "ru" else "modules"
+        return f"{self.label}: {percent}% ({modules} {module_range})..."
+
+    async def update(self, module_range: str, words: int) -> None:
+        self._words[module_range] = words
+        now = time.monotonic()
+        if now - self._last_edit < self.min_interval or now < self._paused_until:
+            return
+        text = self._render(module_range)
+        if text == self._last_text:
+            return
+        self._last_edit = now
+        self._last_text = text
+        try:
+            await self.status_msg.edit_text(text)
+        except TelegramBadRequest as e:
+            logger.debug(f"Skipped progress update: {str(e)}")
+        except TelegramRetryAfter as e:
+            self._paused_until = now + e.retry_after
+            logger.warning(f"Progress updates paused for {e.retry_after}s by flood control")
+        except TelegramAPIError as e:
+            logger.warning(f"Progress update failed: {str(e)}")
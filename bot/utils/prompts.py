@@ -1,8 +1,39 @@
+# System prompt shared by every book request. Requests are laid out as
+# system prompt, book content, then the action-specific instructions, so the
+# system prompt and book form a byte-identical prefix that DeepSeek's context
+# cache can serve for the second module part and for follow-up actions.
+BOOK_SYSTEM_PROMPT = """
+You are an expert author of educational workbooks. The user message contains the text of a book followed by instructions.
+Base everything you write on the book and follow the instructions exactly, writing in the language the instructions are written in.
+"""
+
+BOOK_USER_TEMPLATE = "Book content:\n\n{content}\n\n---\n\nInstructions:\n{instructions}"
+
+# Map-reduce digest prompt, used to condense book sections that do not fit in one request
+CHAPTER_DIGEST_PROMPT = """
+You are condensing part {part} of {total_parts} of a book so that the whole book can later be summarized in one request.
+Write a dense digest of this part in at most {max_words} words, in the same language as the text.
+- Keep the chapter titles and their order as markdown headings.
+- Preserve key concepts, frameworks, arguments, names, numbers, data and concrete examples or stories.
+- Preserve memorable quotations verbatim when they carry a key idea.
+- Do not add commentary, evaluation or content that is not in the text.
+"""
+
+# Appended to the original instructions when an answer stopped short of its word target
+CONTINUATION_PROMPT = """
+You already started this answer for modules {module_range} but stopped after about {words} words. It currently ends with:
+
+<<<
+{tail}
+>>>
+
+Continue the answer from exactly where it stops, adding about {min_words}-{max_words} more words.
+- Do not repeat anything that is already written and do not restart the document or its title.
+- If it stops mid-sentence, mid-table or mid-module, first complete that, then write the remaining modules of {module_range}.
+"""
+
 # English Prompts
 SUMMARY_PROMPT_EN = """
-Content: {content}
-
-Instructions:
 Generate an extensive workbook-style summary of the provided book content in markdown format, styled as a professional marketing workbook with rich, detailed content, visual elements, and interactive components. The output **must** be 6000-7000 words (~20-25 pages at 250-300 words/page), ensuring a dense, interactive workbook like a professional marketing resource. Strictly enforce this word count, completing all 8 modules fully with no truncation. Use concrete book examples (e.g., Miller’s bulimia recovery, Diana Nyad’s swim) and tie to themes like BRIDGE, Good Grit, and psychological safety. Follow this structure exactly:
 
 # Summary Workbook: [Book Title]
@@ -132,9 +163,6 @@ Generate an extensive workbook-style summary of the provided book content in mar
 """
 
 WORKSHEET_PROMPT_EN = """
-Content: {content}
-
-Instructions:
 Generate an extensive workbook with exercises based on the book content in markdown, styled as a professional marketing workbook. Target 4000-5000 words (~15-20 pages at 250-300 words/page), ensuring interactive, actionable content. Use this structure:
 
 # Workbook: [Book Title] Exercises
@@ -195,9 +223,6 @@ Generate an extensive workbook with exercises based on the book content in markd
 """
 
 QUIZ_PROMPT_EN = """
-Content: {content}
-
-Instructions:
 Generate a comprehensive questionnaire based on the book content in markdown, styled as a professional workbook. Target 2500-3000 words (~10-12 pages at 250-300 words/page), ensuring engaging, structured content. Use this structure:
 
 # Quiz: [Book Title]
@@ -233,9 +258,6 @@ Generate a comprehensive questionnaire based on the book content in markdown, st
 """
 
 ANALYSIS_PROMPT_EN = """
-Content: {content}
-
-Instructions:
 Generate an extensive workbook-style literary analysis of the book in markdown, styled as a professional marketing workbook. Target 4000-5000 words (~15-20 pages at 250-300 words/page), ensuring deep, structured insights. Use this structure:
 
 # Literary Analysis: [Book Title]
@@ -303,9 +325,6 @@ Generate an extensive workbook-style literary analysis of the book in markdown,
 
 # Russian Prompts
 SUMMARY_PROMPT_RU = """
-Content: {content}
-
-Instructions:
 Сгенерируйте обширный конспект в стиле рабочей тетради на основе содержания книги в формате markdown, оформленный как профессиональная маркетинговая рабочая тетрадь с насыщенным, детализированным содержимым, визуальными элементами и интерактивными компонентами. Выходной текст **должен** быть 6000–7000 слов (~20–25 страниц при 250–300 словах/страница), обеспечивая плотную, интерактивную рабочую тетрадь. Строго соблюдайте этот объем, полностью завершая все 8 модулей без усечения. Используйте конкретные примеры из книги (например, восстановление Миллер, плавание Дианы Няд) и связывайте с темами BRIDGE, Good Grit и психологическая безопасность. Следуйте этой структуре:
 
 # Конспект: [Название книги]
@@ -435,9 +454,6 @@ Instructions:
 """
 
 WORKSHEET_PROMPT_RU = """
-Content: {content}
-
-Instructions:
 Сгенерируйте обширную рабочую тетрадь с упражнениями на основе содержания книги в формате markdown, оформленную как профессиональная маркетинговая рабочая тетрадь. Цель — 4000–5000 слов (~15–20 страниц при 250–300 словах/страница), обеспечивая интерактивный, действенный контент. Используйте следующую структуру:
 
 # Рабочая тетрадь: [Название книги]
@@ -498,9 +514,6 @@ Instructions:
 """
 
 QUIZ_PROMPT_RU = """
-Content: {content}
-
-Instructions:
 Сгенерируйте обширную анкету на основе содержания книги в формате markdown, оформленную как профессиональная рабочая тетрадь. Цель — 2500–3000 слов (~10–12 страниц при 250–300 словах/страница), обеспечивая увлекательный, структурированный контент. Используйте следующую структуру:
 
 # Анкета: [Название книги]
@@ -536,9 +549,6 @@ Instructions:
 """
 
 ANALYSIS_PROMPT_RU = """
-Content: {content}
-
-Instructions:
 Сгенерируйте обширный литературный анализ в стиле рабочей тетради на основе книги в формате markdown, оформленный как профессиональная маркетинговая рабочая тетрадь. Цель — 4000–5000 слов (~15–20 страниц при 250–300 словах/страница), обеспечивая глубокие, структурированные инсайты. Используйте следующую структуру:
 
 # Литературный анализ: [Название книги]
@@ -602,4 +612,18 @@ Instructions:
 - Если разделяется, сгенерируйте как один файл или объедините части.
 - Приоритет завершения модулей, если усекается.
 - Используйте примеры из книги (например, восстановление Миллер).
-"""
\ No newline at end of file
+"""
+# Prompt registry: action -> language -> prompt, used by the handlers and bot.batch
+LANGUAGES = ("en", "ru")
+DEFAULT_LANGUAGE = "en"
+ACTION_PROMPTS = {
+    "summary": {"en": SUMMARY_PROMPT_EN, "ru": SUMMARY_PROMPT_RU},
+    "worksheet": {"en": WORKSHEET_PROMPT_EN, "ru": WORKSHEET_PROMPT_RU},
+    "quiz": {"en": QUIZ_PROMPT_EN, "ru": QUIZ_PROMPT_RU},
+    "analysis": {"en": ANALYSIS_PROMPT_EN, "ru": ANALYSIS_PROMPT_RU},
+}
+
+def get_prompt(action: str, language: str) -> str:
+    """Prompt for an action in the user's language, falling back to English."""
+    prompts = ACTION_PROMPTS[action]
+    return prompts.get(language, prompts[DEFAULT_LANGUAGE])
@@ -0,0 +1,5 @@
+import os
+
+# Settings require these at import time; tests never call the real APIs
+os.environ.setdefault("BOT_TOKEN", "test-token")
+os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
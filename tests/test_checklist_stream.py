@@ -0,0 +1,42 @@
+import asyncio
+import json
+import httpx
+import pytest
+from openai import AsyncOpenAI
+from bot.services.deepseek_checklist_service import ChecklistService
+
+class SseBody(httpx.AsyncByteStream):
+    """Server-sent chat completion chunks that never finish, recording when closed."""
+
+    def __init__(self):
+        self.closed = False
+
+    async def __aiter__(self):
+        i = 0
+        while True:
+            chunk = {"id": "1", "object": "chat.completion.chunk", "created": 0, "model": "deepseek-chat",
+                     "choices": [{"index": 0, "delta": {"content": f"word{i} "}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n".encode()
+            i += 1
+            await asyncio.sleep(0)
+
+    async def aclose(self):
+        self.closed = True
+
+def test_cancelled_stream_is_closed():
+    body = SseBody()
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(200, headers={"content-type": "text/event-stream"}, stream=body))
+
+    async def on_progress(module_range, words):
+        if words >= 5:
+            raise asyncio.CancelledError
+
+    async def run():
+        client = AsyncOpenAI(api_key="x", base_url="http://test", http_client=httpx.AsyncClient(transport=transport))
+        stream = await client.chat.completions.create(model="deepseek-chat", messages=[], stream=True)
+        await ChecklistService._consume_stream(stream, on_progress)
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(run())
+    assert body.closed
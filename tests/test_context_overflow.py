@@ -0,0 +1,42 @@
+import asyncio
+from io import BytesIO
+import httpx
+import openai
+import pytest
+from bot.services.deepseek_service import DeepSeekService
+from bot.services.executor import shutdown_executor
+
+@pytest.fixture(scope="module", autouse=True)
+def process_pool():
+    yield
+    shutdown_executor()
+
+def _too_long() -> openai.BadRequestError:
+    response = httpx.Response(400, request=httpx.Request("POST", "http://test/chat/completions"))
+    return openai.BadRequestError("This model's maximum context length is 65536 tokens. However, you requested "
+                                  "131072 tokens. Please reduce the length of the messages.",
+                                  response=response, body=None)
+
+def test_single_pdf_condenses_content_after_context_overflow():
+    service = DeepSeekService()
+    requests, budgets = [], []
+
+    async def fake_condense(content, instructions, budget=None):
+        budgets.append(budget)
+        return content if budget is None else "condensed"
+
+    async def fake_generate_content(content, instructions, module_range, on_progress=None, builder=None,
+                                    *args, **kwargs):
+        requests.append(content)
+        if content != "condensed":
+            raise _too_long()
+        builder.feed("# Worksheet\n\nDone.\n")
+        return "# Worksheet\n\nDone.\n"
+
+    service._condense_content = fake_condense
+    service._generate_content = fake_generate_content
+    output = asyncio.run(service.generate_pdf("book " * 1000, "write a worksheet", BytesIO()))
+
+    assert requests == ["book " * 1000, "condensed"]
+    assert budgets[0] is None and budgets[1] > 0
+    assert output.getvalue().startswith(b"%PDF")
@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+from reportlab.platypus import KeepTogether, Paragraph
+from bot.services.deepseek_service import DeepSeekService, continuation_suffix
+from bot.services.executor import shutdown_executor
+from bot.services.pdf_generator import IncrementalPdfBuilder
+
+@pytest.fixture(scope="module", autouse=True)
+def process_pool():
+    yield
+    shutdown_executor()
+
+def _continue(first: str, continuation: str):
+    service = DeepSeekService()
+
+    async def fake_generate_content(*args, **kwargs):
+        return continuation
+
+    service._generate_content = fake_generate_content
+
+    async def run():
+        builder = IncrementalPdfBuilder()
+        builder.feed(first)
+        text = await service._continue_part("book", "write", "1-2", first, len(first.split()), 1000,
+                                            None, builder, min_words=1)
+        return text, await builder.finish()
+
+    return asyncio.run(run())
+
+def _styled(flowables):
+    items = []
+    for flowable in flowables:
+        flowable = flowable._content[0] if isinstance(flowable, KeepTogether) else flowable
+        if isinstance(flowable, Paragraph):
+            items.append((flowable.style.name, flowable.getPlainText()))
+    return items
+
+def test_heading_continuation_starts_a_new_section():
+    text, flowables = _continue("## Module 1: Intro\n\nShort answer ended here.",
+                                "## Module 2: Core Themes\n\nMore text.")
+    assert text == "## Module 1: Intro\n\nShort answer ended here.\n\n## Module 2: Core Themes\n\nMore text."
+    assert _styled(flowables) == [("Heading1", "Module 1: Intro"), ("BodyText", "Short answer ended here."),
+                                  ("Heading1", "Module 2: Core Themes"), ("BodyText", "More text.")]
+
+def test_mid_sentence_continuation_joins_with_a_space():
+    text, flowables = _continue("## Module 1\n\nThe author argues that", "practice compounds.")
+    assert text == "## Module 1\n\nThe author argues that practice compounds."
+    assert _styled(flowables)[1] == ("BodyText", "The author argues that practice compounds.")
+
+@pytest.mark.parametrize("text, continuation, suffix", [
+    ("Done.\n", "| A | B |", "\n| A | B |"),
+    ("Done.\n\n", "- item", "- item"),
+    ("list of", " items", " items"),
+    ("first line", "1. step", "\n\n1. step"),
+])
+def test_continuation_suffix(text, continuation, suffix):
+    assert continuation_suffix(text, continuation) == suffix
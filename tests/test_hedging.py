@@ -0,0 +1,64 @@
+import asyncio
+from bot.config.settings import settings
+from bot.services import deepseek_service
+from bot.services.deepseek_service import DeepSeekService
+from bot.services.llm_usage import RequestUsage
+from bot.services.rate_limiter import RateLimiter
+
+def _service(monkeypatch, calls, seconds):
+    async def fake_stream_text(model, messages, module_range, on_progress=None, on_text=None, started=None):
+        await asyncio.sleep(seconds)
+        return "text", RequestUsage()
+
+    monkeypatch.setattr(deepseek_service, "stream_text", fake_stream_text)
+    monkeypatch.setattr(settings, "LLM_STREAMING", True)
+    monkeypatch.setattr(settings, "LLM_HEDGING_ENABLED", True)
+    monkeypatch.setattr(settings, "HEDGE_DEFAULT_DELAY_SECONDS", 0.2)
+    service = DeepSeekService()
+    service.limiter = RateLimiter(max_in_flight=1, tokens_per_minute=10**9)
+    call_model = service._call_model
+
+    async def counting_call_model(llm, messages, module_range, *args, **kwargs):
+        calls.append(module_range)
+        return await call_model(llm, messages, module_range, *args, **kwargs)
+
+    service._call_model = counting_call_model
+    return service
+
+def _hedged(service, key):
+    return service._generate_hedged([], "1", 100, key, None, None, None)
+
+def test_queue_time_does_not_trigger_hedge(monkeypatch):
+    calls = []
+    service = _service(monkeypatch, calls, seconds=0.1)
+
+    async def run():
+        async with service.limiter.acquire():
+            task = asyncio.create_task(_hedged(service, "queued"))
+            await asyncio.sleep(0.4)
+        return await task
+
+    assert asyncio.run(run()) == ("text", service.llm.model_name)
+    assert calls == ["1"]
+
+def test_slow_call_is_hedged(monkeypatch):
+    calls = []
+    service = _service(monkeypatch, calls, seconds=0.5)
+    service.limiter = RateLimiter(max_in_flight=2, tokens_per_minute=10**9)
+    assert asyncio.run(_hedged(service, "slow"))[0] == "text"
+    assert calls == ["1", "1-hedge"]
+
+def test_no_hedge_while_limiter_has_waiters(monkeypatch):
+    calls = []
+    service = _service(monkeypatch, calls, seconds=0.5)
+
+    async def run():
+        task = asyncio.create_task(_hedged(service, "saturated"))
+        await asyncio.sleep(0.05)
+        waiter = asyncio.create_task(service.limiter.acquire().__aenter__())
+        result = await task
+        waiter.cancel()
+        return result
+
+    assert asyncio.run(run())[0] == "text"
+    assert calls == ["1"]
@@ -0,0 +1,34 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+from bot.services.llm_cache import ResponseCache
+
+def _value(i: int) -> str:
+    words = random.Random(i).choices(["книга", "модуль", "идея", "practice", "feedback", "chapter"], k=40_000)
+    return f"Answer {i}: " + " ".join(words)
+
+def test_concurrent_get_and_set(tmp_path):
+    """Worker threads share the cache, as asyncio.to_thread calls do."""
+    cache = ResponseCache(f"sqlite:///{tmp_path / 'cache.db'}", ttl_seconds=3600, max_bytes=10**9)
+    keys = [cache.make_key("model", f"prompt {i}", "content") for i in range(40)]
+    values = [_value(i) for i in range(40)]
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(lambda i: cache._set(keys[i], "model", values[i]), range(40)))
+        read = list(pool.map(cache._get, keys * 8))
+
+    assert read == values * 8
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    cache = ResponseCache(f"sqlite:///{tmp_path / 'cache.db'}", ttl_seconds=3600, max_bytes=10**9)
+    keys = [cache.make_key("model", f"prompt {i}", "content") for i in range(6)]
+    for i, key in enumerate(keys):
+        cache._set(key, "model", _value(i))
+    cache._get(keys[0])  # most recently used now
+    sizes = [len(cache._codec()[0].compress(_value(i).encode("utf-8"))) for i in range(6)]
+    # Room for the newest entry plus about two more
+    cache.max_bytes = sizes[0] + sizes[4] + sizes[5] + 10
+    newest = cache.make_key("model", "prompt new", "content")
+    cache._set(newest, "model", _value(5))
+
+    kept = [key for key in keys + [newest] if cache._get(key) is not None]
+    assert kept == [keys[0], keys[5], newest]
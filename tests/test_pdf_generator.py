@@ -0,0 +1,59 @@
+import asyncio
+from io import BytesIO
+import pytest
+from reportlab.platypus import KeepTogether, Paragraph, Table
+from bot.services import pdf_generator
+from bot.services.executor import run_cpu_bound, shutdown_executor
+from bot.services.pdf_generator import IncrementalPdfBuilder, layout_pdf_bytes, write_pdf
+
+@pytest.fixture(scope="module", autouse=True)
+def process_pool():
+    yield
+    shutdown_executor()
+
+def _texts(flowables):
+    texts = []
+    for flowable in flowables:
+        if isinstance(flowable, KeepTogether):
+            texts += _texts(flowable._content)
+        elif isinstance(flowable, Paragraph):
+            texts.append(flowable.getPlainText())
+    return texts
+
+def test_builder_keeps_section_order():
+    async def run():
+        builder = IncrementalPdfBuilder()
+        for piece in ["# Title\n\nintro\n\n## Mod", "ule 1\n\none\n\n## Module 2\n\n", "two\n"]:
+            builder.feed(piece)
+        return await builder.finish()
+
+    assert _texts(asyncio.run(run())) == ["Title", "intro", "Module 1", "one", "Module 2", "two"]
+
+def test_section_kept_as_text_when_conversion_fails(monkeypatch):
+    def broken(section):
+        raise ValueError("bad markup")
+
+    monkeypatch.setattr(pdf_generator, "markdown_to_flowables", broken)
+    flowables = pdf_generator._section_flowables("# Title\n\nsome <text>\n")
+    assert _texts(flowables) == ["# Title", "some <text>"]
+
+def test_layout_in_process_pool():
+    async def run():
+        builder = IncrementalPdfBuilder()
+        builder.feed("# Title\n\n| A | B |\n|---|---|\n| 1 | **2** |\n")
+        data = await run_cpu_bound(layout_pdf_bytes, await builder.finish())
+        return write_pdf(data, BytesIO()).getvalue()
+
+    assert asyncio.run(run()).startswith(b"%PDF")
+
+def test_inline_html_in_cells_and_lists():
+    """Stashed inline HTML must not reach ReportLab as is: <br> without a slash is a syntax error."""
+    markdown = ("| Step | Notes |\n|---|---|\n| 1 | first<br>second |\n| 2 | <b>bold</b> <div>x</div> &copy; |\n\n"
+                "- one<br>two\n- <b>unclosed\n\nText with <span style='x'>span</span>\n")
+    flowables = pdf_generator.markdown_to_flowables(markdown)
+    table = next(f for f in flowables if isinstance(f, (Table, KeepTogether)))
+    table = table._content[0] if isinstance(table, KeepTogether) else table
+    assert table._cellvalues[1][1].text == "first<br/>second"
+    assert table._cellvalues[2][1].text == "<b>bold</b> &lt;div&gt;x&lt;/div&gt; ©"
+    assert _texts(flowables) == ["• onetwo", "• unclosed", "Text with <span style='x'>span</span>"]
+    assert pdf_generator.render_pdf_bytes(markdown).startswith(b"%PDF")
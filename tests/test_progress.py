@@ -0,0 +1,33 @@
+import asyncio
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import EditMessageText
+from bot.utils.progress import ProgressReporter
+
+class FailingMessage:
+    def __init__(self, error):
+        self.error = error
+        self.edits = 0
+
+    async def edit_text(self, text):
+        self.edits += 1
+        raise self.error
+
+def _method():
+    return EditMessageText(text="x", chat_id=1, message_id=1)
+
+def test_network_error_does_not_escape():
+    message = FailingMessage(TelegramNetworkError(_method(), "connection reset"))
+    reporter = ProgressReporter(message, "Summary", target_words=100, min_interval=0)
+    asyncio.run(reporter.update("all", 10))
+    assert message.edits == 1
+
+def test_retry_after_pauses_updates():
+    message = FailingMessage(TelegramRetryAfter(_method(), "flood control", retry_after=30))
+    reporter = ProgressReporter(message, "Summary", target_words=100, min_interval=0)
+
+    async def run():
+        await reporter.update("all", 10)
+        await reporter.update("all", 20)
+
+    asyncio.run(run())
+    assert message.edits == 1